@@ -1,156 +1,843 @@
+import time
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Literal
+from typing import List, Literal, Optional, Union
 
-from langchain_core.messages import SystemMessage, merge_message_runs
+import httpx
+from langchain_core.messages import (
+    HumanMessage,
+    RemoveMessage,
+    SystemMessage,
+    merge_message_runs,
+)
+from langchain_core.messages.utils import count_tokens_approximately
 from langchain_core.runnables import RunnableConfig
 from langchain_openai import ChatOpenAI
 from langgraph.graph import END, START, MessagesState, StateGraph
 from langgraph.store.base import BaseStore
+from langgraph.utils.runnable import RunnableCallable
 
-from memory import MemoryManager
-from models import Ingredients, Preferences, UpdateMemory
+from extraction_cache import ExtractionCache
+from llm_scheduler import (
+    SCHEDULER_BASE_URL,
+    AsyncSchedulingTransport,
+    LLMScheduler,
+    Priority,
+    SchedulingTransport,
+    llm_priority,
+)
+from memory import AsyncMemoryManager, MemoryManager
+from memory_queue import MemoryUpdateJob, MemoryUpdateQueue
+from models import (
+    Ingredients,
+    IngredientsPatch,
+    MemoryPatch,
+    MemoryUpdate,
+    Preferences,
+    FindRecipes,
+    PreferencesPatch,
+    UpdateMemory,
+)
+from prompt_cache import PromptCacheMonitor
 from prompts import (
+    INGREDIENTS_CONTEXT,
     INGREDIENTS_INSTRUCTION,
+    INGREDIENTS_PATCH_INSTRUCTION,
+    MEMORY_CONTEXT,
+    MEMORY_INSTRUCTION,
+    MEMORY_PATCH_INSTRUCTION,
+    MODEL_MEMORY_MESSAGE,
     MODEL_SYSTEM_MESSAGE,
+    PREFERENCES_CONTEXT,
     PREFERENCES_INSTRUCTION,
+    PREFERENCES_PATCH_INSTRUCTION,
+    RECIPES_MESSAGE,
+    SUMMARIZE_INSTRUCTION,
+    SUMMARY_MESSAGE,
 )
+from prerouter import PreRouter
+from recipes import RecipeIndex, format_matches
+from reasoning import (
+    DEFAULT_REASONING_STORAGE,
+    ReasoningStorage,
+    split_reasoning,
+    strip_reasoning,
+    without_reasoning,
+)
+from tracing import TurnTrace, trace_turn
+
+
+MODEL_NAME = "qwen3:14b"
+MODEL_BASE_URL = "http://localhost:11434/v1"
+
+# Recipes returned per FindRecipes call
+RECIPE_RESULTS = 5
+
+
+@dataclass
+class TurnStats:
+    """Timing information collected while streaming a single turn"""
+
+    started_at: float = 0.0
+    time_to_first_token: Optional[float] = None
+    total_time: Optional[float] = None
+
+    def start(self):
+        self.started_at = time.perf_counter()
+
+    def mark_token(self):
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self.started_at
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started_at
+
+
+class AgentState(MessagesState):
+    # Rolling summary of the messages trimmed from the context window
+    summary: str
 
 
 class IngredientTrackerAgent:
-    def __init__(self, memory_manager: MemoryManager):
+    def __init__(
+        self,
+        memory_manager: Union[MemoryManager, AsyncMemoryManager],
+        background_memory_updates: bool = False,
+        memory_update_mode: Literal["patch", "full"] = "patch",
+        context_token_budget: Optional[int] = 4000,
+        reasoning_storage: ReasoningStorage = DEFAULT_REASONING_STORAGE,
+        pre_router: Optional[PreRouter] = None,
+        merge_memory_updates: bool = True,
+        scheduler: Optional[LLMScheduler] = None,
+        extraction_cache: Optional[ExtractionCache] = None,
+        recipe_index: Optional[RecipeIndex] = None,
+    ):
         self.memory_manager = memory_manager
+        self.prompt_monitor = PromptCacheMonitor()
+
+        # Routes every LLM request through a concurrency-limited priority
+        # queue, extraction calls wait behind chat calls. None talks to
+        # MODEL_BASE_URL directly.
+        self.scheduler = scheduler
         self.model = self._initialize_model()
-        self.preferences_llm = self.model.with_structured_output(Preferences)
-        self.ingredients_llm = self.model.with_structured_output(Ingredients)
+
+        # With a recipe index the chat model can look up recipes matching the
+        # user's ingredients instead of inventing them. Its tool comes first
+        # so the request prefix is the same with and without UpdateMemory.
+        self.recipe_index = recipe_index
+        self.system_message = MODEL_SYSTEM_MESSAGE
+        recipe_tools = []
+        if recipe_index is not None:
+            self.system_message += RECIPES_MESSAGE
+            recipe_tools = [FindRecipes]
+        self.chat_llm_with_tools = self.model.bind_tools(
+            recipe_tools + [UpdateMemory], parallel_tool_calls=True
+        )
+        self.chat_llm_without_memory = (
+            self.model.bind_tools(recipe_tools, parallel_tool_calls=True)
+            if recipe_tools
+            else self.model
+        )
+
+        # Decides per user message whether the UpdateMemory tool schema needs
+        # to be sent at all, see prerouter.py. None always sends it.
+        self.pre_router = pre_router
+
+        # Once the history exceeds this many (approximate) tokens, the older
+        # half is folded into the summary. None keeps the full history.
+        self.context_token_budget = context_token_budget
+
+        # <think> reasoning is split off chat replies before they are stored
+        # and is never sent back to the model
+        self.reasoning_storage = reasoning_storage
+
+        # "patch" has the model emit only what changed, which is applied in the
+        # database. "full" regenerates the whole list like before.
+        self.memory_update_mode = memory_update_mode
+        if memory_update_mode == "patch":
+            schemas = (PreferencesPatch, IngredientsPatch, MemoryPatch)
+        elif memory_update_mode == "full":
+            schemas = (Preferences, Ingredients, MemoryUpdate)
+        else:
+            raise ValueError(f"Unknown memory_update_mode: {memory_update_mode}")
+
+        # Identical extraction inputs (retries, repeated turns) are answered
+        # from the cache without calling the model
+        self.extraction_cache = extraction_cache
+        extraction_llms = []
+        for schema in schemas:
+            llm = self.model.with_structured_output(schema)
+            if extraction_cache is not None:
+                llm = extraction_cache.wrap(llm, schema, MODEL_NAME)
+            extraction_llms.append(llm)
+        self.preferences_llm, self.ingredients_llm, self.memory_llm = extraction_llms
+
+        # When both memory types need updating, extract them with one call and
+        # write them in one transaction instead of two separate nodes
+        self.merge_memory_updates = merge_memory_updates
+
+        # With background memory updates the chat reply doesn't wait for the
+        # extraction calls, UpdateMemory calls are queued for a worker instead
+        self.memory_queue = None
+        if background_memory_updates:
+            if isinstance(memory_manager, AsyncMemoryManager):
+                raise ValueError(
+                    "background_memory_updates requires a synchronous MemoryManager"
+                )
+            # Accepted updates are kept in the database until processed
+            self.memory_queue = MemoryUpdateQueue(
+                self._run_memory_update, outbox=memory_manager
+            )
+
         self.graph = self._build_graph()
 
     def _initialize_model(self):
         """Initialize the LLM"""
+        if self.scheduler is None:
+            connection = {"base_url": MODEL_BASE_URL}
+        else:
+            connection = {
+                "base_url": SCHEDULER_BASE_URL,
+                "http_client": httpx.Client(
+                    transport=SchedulingTransport(self.scheduler)
+                ),
+                "http_async_client": httpx.AsyncClient(
+                    transport=AsyncSchedulingTransport(self.scheduler)
+                ),
+            }
+
         return ChatOpenAI(
-            model="qwen3:14b",
+            model=MODEL_NAME,
             temperature=0,
-            base_url="http://localhost:11434/v1",
             api_key="not-needed",
+            stream_usage=True,
+            callbacks=[self.prompt_monitor],
+            **connection,
         )
 
     def _build_graph(self):
         """Builds and returns the LangGraph"""
-        builder = StateGraph(MessagesState)
+        builder = StateGraph(AgentState)
 
-        builder.add_node("update_preferences", self._update_preferences)
-        builder.add_node("update_ingredients", self._update_ingredients)
-        builder.add_node("chat", self._chat)
+        # Each node has a sync and an async implementation so the same graph
+        # serves both `invoke` and `ainvoke`
+        builder.add_node(
+            "update_preferences",
+            RunnableCallable(self._update_preferences, self._aupdate_preferences),
+        )
+        builder.add_node(
+            "update_ingredients",
+            RunnableCallable(self._update_ingredients, self._aupdate_ingredients),
+        )
+        builder.add_node(
+            "update_memory",
+            RunnableCallable(self._update_memory, self._aupdate_memory),
+        )
+        builder.add_node("chat", RunnableCallable(self._chat, self._achat))
+        if self.memory_queue is not None:
+            builder.add_node(
+                "schedule_memory_updates", self._schedule_memory_updates
+            )
+            builder.add_edge("schedule_memory_updates", "chat")
+        if self.recipe_index is not None:
+            builder.add_node(
+                "find_recipes",
+                RunnableCallable(self._find_recipes, self._afind_recipes),
+            )
+            builder.add_edge("find_recipes", "chat")
 
-        builder.add_edge(START, "chat")
+        builder.add_node(
+            "summarize_history",
+            RunnableCallable(self._summarize_history, self._asummarize_history),
+        )
+
+        builder.add_conditional_edges(START, self._route_start)
+        builder.add_edge("summarize_history", "chat")
         builder.add_conditional_edges("chat", self._route_message)
         builder.add_edge("update_preferences", "chat")
         builder.add_edge("update_ingredients", "chat")
+        builder.add_edge("update_memory", "chat")
 
         return builder.compile(
             checkpointer=self.memory_manager.checkpointer,
             store=self.memory_manager.store,
         )
 
-    def _chat(self, state: MessagesState, config: RunnableConfig, store: BaseStore):
-        """Main chat node that processes user input and generates responses"""
-        user_id = config["configurable"]["user_id"]
+    @staticmethod
+    def _history(state: AgentState):
+        """Conversation history with the rolling summary in front, if there is one"""
+        messages = without_reasoning(state["messages"])
+        if not state.get("summary"):
+            return messages
+        summary_msg = SUMMARY_MESSAGE.format(summary=state["summary"])
+        return [SystemMessage(content=summary_msg)] + messages
 
-        user_preferences = self.memory_manager.get_preferences(user_id)
-        ingredients = self.memory_manager.get_ingredients(user_id)
+    def _chat_messages(self, state: AgentState, user_preferences, ingredients):
+        """Build the chat model input from the stored memories and history.
 
-        system_msg = MODEL_SYSTEM_MESSAGE.format(
+        Static instructions come first and the per-user memories last, so the
+        server's prompt cache covers everything up to the newest message.
+        """
+        memory_msg = MODEL_MEMORY_MESSAGE.format(
             user_preferences=user_preferences, ingredients=ingredients
         )
+        return (
+            [SystemMessage(content=self.system_message)]
+            + self._history(state)
+            + [SystemMessage(content=memory_msg)]
+        )
 
-        response = self.model.bind_tools(
-            [UpdateMemory], parallel_tool_calls=True
-        ).invoke([SystemMessage(content=system_msg)] + state["messages"])
+    def _extraction_messages(self, state: AgentState, instruction, context):
+        """Static instruction, the conversation, then the volatile context"""
+        return list(
+            merge_message_runs(
+                [SystemMessage(content=instruction)]
+                + self._history(state)[:-1]
+                + [SystemMessage(content=context)]
+            )
+        )
 
-        return {"messages": [response]}
+    def _preferences_messages(self, state: AgentState, existing_preferences):
+        """Build the preferences extraction input"""
+        instruction = (
+            PREFERENCES_PATCH_INSTRUCTION
+            if self.memory_update_mode == "patch"
+            else PREFERENCES_INSTRUCTION
+        )
+        context = PREFERENCES_CONTEXT.format(
+            current_preferences=existing_preferences, time=datetime.now().isoformat()
+        )
+        return self._extraction_messages(state, instruction, context)
 
-    def _update_preferences(
-        self, state: MessagesState, config: RunnableConfig, store: BaseStore
-    ):
-        """Update user preferences based on conversation"""
-        user_id = config["configurable"]["user_id"]
-        existing_preferences = self.memory_manager.get_preferences(user_id)
+    def _ingredients_messages(self, state: AgentState, existing_ingredients):
+        """Build the ingredients extraction input"""
+        instruction = (
+            INGREDIENTS_PATCH_INSTRUCTION
+            if self.memory_update_mode == "patch"
+            else INGREDIENTS_INSTRUCTION
+        )
+        context = INGREDIENTS_CONTEXT.format(
+            current_ingredients=existing_ingredients, time=datetime.now().isoformat()
+        )
+        return self._extraction_messages(state, instruction, context)
 
-        instruction = PREFERENCES_INSTRUCTION.format(
-            current_preferences=existing_preferences, time=datetime.now().isoformat()
+    def _memory_messages(
+        self, state: AgentState, existing_preferences, existing_ingredients
+    ):
+        """Build the combined preferences and ingredients extraction input"""
+        instruction = (
+            MEMORY_PATCH_INSTRUCTION
+            if self.memory_update_mode == "patch"
+            else MEMORY_INSTRUCTION
         )
+        context = MEMORY_CONTEXT.format(
+            current_preferences=existing_preferences,
+            current_ingredients=existing_ingredients,
+            time=datetime.now().isoformat(),
+        )
+        return self._extraction_messages(state, instruction, context)
 
-        updated_messages = list(
-            merge_message_runs(
-                [SystemMessage(content=instruction)] + state["messages"][:-1]
+    def _save_preferences(self, user_id, result):
+        """Persist an extraction result, either a patch or the full preferences"""
+        if isinstance(result, PreferencesPatch):
+            if not result.is_empty():
+                self.memory_manager.patch_preferences(user_id, result)
+        else:
+            self.memory_manager.update_preferences(user_id, result.model_dump_json())
+
+    async def _asave_preferences(self, user_id, result):
+        """Async version of `_save_preferences`"""
+        if isinstance(result, PreferencesPatch):
+            if not result.is_empty():
+                await self.memory_manager.patch_preferences(user_id, result)
+        else:
+            await self.memory_manager.update_preferences(
+                user_id, result.model_dump_json()
             )
-        )
 
-        result = self.preferences_llm.invoke(updated_messages)
-        self.memory_manager.update_preferences(user_id, result.model_dump_json())
+    def _save_ingredients(self, user_id, result):
+        """Persist an extraction result, either a patch or the full ingredients"""
+        if isinstance(result, IngredientsPatch):
+            if not result.is_empty():
+                self.memory_manager.patch_ingredients(user_id, result)
+        else:
+            self.memory_manager.update_ingredients(user_id, result.model_dump_json())
+
+    async def _asave_ingredients(self, user_id, result):
+        """Async version of `_save_ingredients`"""
+        if isinstance(result, IngredientsPatch):
+            if not result.is_empty():
+                await self.memory_manager.patch_ingredients(user_id, result)
+        else:
+            await self.memory_manager.update_ingredients(
+                user_id, result.model_dump_json()
+            )
 
-        tool_calls = state["messages"][-1].tool_calls
+    def _save_memory(self, user_id, result):
+        """Persist a combined extraction result, either patches or full lists"""
+        if isinstance(result, MemoryPatch):
+            if result.preferences.is_empty() and result.ingredients.is_empty():
+                return
+            self.memory_manager.patch_memory(
+                user_id, result.preferences, result.ingredients
+            )
+        else:
+            self.memory_manager.update_memory(
+                user_id,
+                result.preferences.model_dump_json(),
+                result.ingredients.model_dump_json(),
+            )
+
+    async def _asave_memory(self, user_id, result):
+        """Async version of `_save_memory`"""
+        if isinstance(result, MemoryPatch):
+            if result.preferences.is_empty() and result.ingredients.is_empty():
+                return
+            await self.memory_manager.patch_memory(
+                user_id, result.preferences, result.ingredients
+            )
+        else:
+            await self.memory_manager.update_memory(
+                user_id,
+                result.preferences.model_dump_json(),
+                result.ingredients.model_dump_json(),
+            )
+
+    @staticmethod
+    def _memory_calls(state: AgentState, update_type=None):
+        """The chat node's UpdateMemory calls, optionally only of one type"""
+        return [
+            tool_call
+            for tool_call in state["messages"][-1].tool_calls
+            if tool_call["name"] == UpdateMemory.__name__
+            and update_type in (None, tool_call["args"].get("update_type"))
+        ]
+
+    def _tool_responses(self, state: AgentState, content, update_type=None):
+        """Tool messages answering the chat node's UpdateMemory calls"""
         return {
             "messages": [
                 {
                     "role": "tool",
-                    "content": "preferences have been updated",
-                    "tool_call_id": tool_calls[0]["id"],
+                    "content": content,
+                    "tool_call_id": tool_call["id"],
                 }
+                for tool_call in self._memory_calls(state, update_type)
             ]
         }
 
+    def _route_start(self, state: AgentState) -> Literal["summarize_history", "chat"]:
+        """Summarize the older part of the history once it exceeds the token budget"""
+        if (
+            self.context_token_budget is not None
+            and count_tokens_approximately(state["messages"])
+            > self.context_token_budget
+        ):
+            return "summarize_history"
+        return "chat"
+
+    def _split_history(self, messages):
+        """Split messages into the part to summarize and the recent part to keep.
+
+        The recent part fits in half the token budget and starts at a human
+        message, so tool calls are never separated from their results. The
+        latest human message is always kept.
+        """
+        keep_budget = self.context_token_budget // 2
+        human_indices = [
+            i for i, message in enumerate(messages) if isinstance(message, HumanMessage)
+        ]
+        if not human_indices:
+            return [], messages
+
+        start = human_indices[-1]
+        for i in reversed(human_indices[:-1]):
+            if count_tokens_approximately(messages[i:]) > keep_budget:
+                break
+            start = i
+        return messages[:start], messages[start:]
+
+    def _summary_request(self, state: AgentState, older):
+        instruction = SUMMARIZE_INSTRUCTION.format(summary=state.get("summary", ""))
+        return without_reasoning(older) + [HumanMessage(content=instruction)]
+
+    @staticmethod
+    def _summary_update(older, response):
+        _, summary = split_reasoning(response.content)
+        return {
+            "summary": summary,
+            "messages": [RemoveMessage(id=message.id) for message in older],
+        }
+
+    def _summarize_history(self, state: AgentState):
+        """Fold older messages into the rolling summary and drop them from state"""
+        older, _ = self._split_history(state["messages"])
+        if not older:
+            return {}
+
+        response = self.model.invoke(self._summary_request(state, older))
+        return self._summary_update(older, response)
+
+    async def _asummarize_history(self, state: AgentState):
+        """Async version of `_summarize_history`"""
+        older, _ = self._split_history(state["messages"])
+        if not older:
+            return {}
+
+        response = await self.model.ainvoke(self._summary_request(state, older))
+        return self._summary_update(older, response)
+
+    def _pre_routed_text(self, state: AgentState):
+        """The user message to pre-route, None if tools must always be bound"""
+        message = state["messages"][-1]
+        if self.pre_router is None or not isinstance(message, HumanMessage):
+            return None
+        return message.content
+
+    def _chat_llm(self, may_update_memory):
+        if may_update_memory:
+            return self.chat_llm_with_tools
+        return self.chat_llm_without_memory
+
+    def _chat(self, state: AgentState, config: RunnableConfig, store: BaseStore):
+        """Main chat node that processes user input and generates responses"""
+        user_id = config["configurable"]["user_id"]
+
+        user_preferences = self.memory_manager.get_preferences(user_id)
+        ingredients = self.memory_manager.get_ingredients(user_id)
+
+        text = self._pre_routed_text(state)
+        may_update_memory = text is None or self.pre_router.memory_may_apply(text)
+
+        response = self._chat_llm(may_update_memory).invoke(
+            self._chat_messages(state, user_preferences, ingredients)
+        )
+
+        return {"messages": [strip_reasoning(response, self.reasoning_storage)]}
+
+    async def _achat(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Async version of `_chat`"""
+        user_id = config["configurable"]["user_id"]
+
+        user_preferences = await self.memory_manager.get_preferences(user_id)
+        ingredients = await self.memory_manager.get_ingredients(user_id)
+
+        text = self._pre_routed_text(state)
+        may_update_memory = text is None or await self.pre_router.amemory_may_apply(
+            text
+        )
+
+        response = await self._chat_llm(may_update_memory).ainvoke(
+            self._chat_messages(state, user_preferences, ingredients)
+        )
+
+        return {"messages": [strip_reasoning(response, self.reasoning_storage)]}
+
+    def _update_preferences(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Update user preferences based on conversation"""
+        user_id = config["configurable"]["user_id"]
+        existing_preferences = self.memory_manager.get_preferences(user_id)
+
+        with llm_priority(Priority.BACKGROUND):
+            result = self.preferences_llm.invoke(
+                self._preferences_messages(state, existing_preferences)
+            )
+        self._save_preferences(user_id, result)
+
+        return self._tool_responses(
+            state, "preferences have been updated", "preferences"
+        )
+
+    async def _aupdate_preferences(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Async version of `_update_preferences`"""
+        user_id = config["configurable"]["user_id"]
+        existing_preferences = await self.memory_manager.get_preferences(user_id)
+
+        with llm_priority(Priority.BACKGROUND):
+            result = await self.preferences_llm.ainvoke(
+                self._preferences_messages(state, existing_preferences)
+            )
+        await self._asave_preferences(user_id, result)
+
+        return self._tool_responses(
+            state, "preferences have been updated", "preferences"
+        )
+
     def _update_ingredients(
-        self, state: MessagesState, config: RunnableConfig, store: BaseStore
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
     ):
         """Update user ingredients based on conversation"""
         user_id = config["configurable"]["user_id"]
         existing_ingredients = self.memory_manager.get_ingredients(user_id)
 
-        instruction = INGREDIENTS_INSTRUCTION.format(
-            current_ingredients=existing_ingredients, time=datetime.now().isoformat()
+        with llm_priority(Priority.BACKGROUND):
+            result = self.ingredients_llm.invoke(
+                self._ingredients_messages(state, existing_ingredients)
+            )
+        self._save_ingredients(user_id, result)
+
+        return self._tool_responses(
+            state, "ingredients have been updated", "ingredients"
         )
 
-        updated_messages = list(
-            merge_message_runs(
-                [SystemMessage(content=instruction)] + state["messages"][:-1]
+    async def _aupdate_ingredients(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Async version of `_update_ingredients`"""
+        user_id = config["configurable"]["user_id"]
+        existing_ingredients = await self.memory_manager.get_ingredients(user_id)
+
+        with llm_priority(Priority.BACKGROUND):
+            result = await self.ingredients_llm.ainvoke(
+                self._ingredients_messages(state, existing_ingredients)
             )
+        await self._asave_ingredients(user_id, result)
+
+        return self._tool_responses(
+            state, "ingredients have been updated", "ingredients"
         )
 
-        result = self.ingredients_llm.invoke(updated_messages)
-        self.memory_manager.update_ingredients(user_id, result.model_dump_json())
+    def _update_memory(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Update preferences and ingredients with a single extraction call"""
+        user_id = config["configurable"]["user_id"]
+        existing_preferences = self.memory_manager.get_preferences(user_id)
+        existing_ingredients = self.memory_manager.get_ingredients(user_id)
 
-        tool_calls = state["messages"][-1].tool_calls
-        return {
-            "messages": [
+        with llm_priority(Priority.BACKGROUND):
+            result = self.memory_llm.invoke(
+                self._memory_messages(
+                    state, existing_preferences, existing_ingredients
+                )
+            )
+        self._save_memory(user_id, result)
+
+        return self._tool_responses(
+            state, "preferences and ingredients have been updated"
+        )
+
+    async def _aupdate_memory(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Async version of `_update_memory`"""
+        user_id = config["configurable"]["user_id"]
+        existing_preferences = await self.memory_manager.get_preferences(user_id)
+        existing_ingredients = await self.memory_manager.get_ingredients(user_id)
+
+        with llm_priority(Priority.BACKGROUND):
+            result = await self.memory_llm.ainvoke(
+                self._memory_messages(
+                    state, existing_preferences, existing_ingredients
+                )
+            )
+        await self._asave_memory(user_id, result)
+
+        return self._tool_responses(
+            state, "preferences and ingredients have been updated"
+        )
+
+    def _recipe_responses(self, state: AgentState, ingredients, preferences):
+        """Tool messages answering FindRecipes calls from the recipe index"""
+        tool_messages = []
+        for tool_call in state["messages"][-1].tool_calls:
+            if tool_call["name"] != FindRecipes.__name__:
+                continue
+
+            args = tool_call["args"]
+            restrictions = preferences.dietary_restrictions if preferences else []
+            matches = self.recipe_index.search(
+                ingredients.names if ingredients else [],
+                max_missing=max(0, int(args.get("max_missing") or 0)),
+                dislikes=preferences.dislikes if preferences else [],
+                dietary_restrictions=restrictions,
+                must_use=args.get("must_use") or [],
+                limit=RECIPE_RESULTS,
+            )
+            # Left to the chat model, e.g. "paleo"
+            unrecognized = self.recipe_index.unrecognized_restrictions(restrictions)
+            tool_messages.append(
                 {
                     "role": "tool",
-                    "content": "ingredients have been updated",
-                    "tool_call_id": tool_calls[0]["id"],
+                    "content": format_matches(matches, unrecognized),
+                    "tool_call_id": tool_call["id"],
                 }
-            ]
-        }
+            )
+
+        return {"messages": tool_messages}
+
+    def _find_recipes(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Answer FindRecipes calls with recipes matching the user's pantry"""
+        user_id = config["configurable"]["user_id"]
+        return self._recipe_responses(
+            state,
+            self.memory_manager.get_ingredients_model(user_id),
+            self.memory_manager.get_preferences_model(user_id),
+        )
+
+    async def _afind_recipes(
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ):
+        """Async version of `_find_recipes`"""
+        user_id = config["configurable"]["user_id"]
+        return self._recipe_responses(
+            state,
+            await self.memory_manager.get_ingredients_model(user_id),
+            await self.memory_manager.get_preferences_model(user_id),
+        )
+
+    def _schedule_memory_updates(self, state: AgentState, config: RunnableConfig):
+        """Queue memory extraction for the background worker and answer right away"""
+        user_id = config["configurable"]["user_id"]
+        tool_messages = []
+
+        for tool_call in self._memory_calls(state):
+            update_type = tool_call["args"].get("update_type")
+            if update_type in ("preferences", "ingredients"):
+                self.memory_queue.submit(user_id, update_type, self._history(state))
+                content = f"{update_type} will be updated"
+            else:
+                content = (
+                    f"Invalid update_type {update_type!r}, expected "
+                    "'preferences' or 'ingredients'"
+                )
+            tool_messages.append(
+                {
+                    "role": "tool",
+                    "content": content,
+                    "tool_call_id": tool_call["id"],
+                }
+            )
+
+        return {"messages": tool_messages}
+
+    def _run_memory_update(self, job: MemoryUpdateJob):
+        """Extract and persist one queued memory update"""
+        state = {"messages": job.messages}
+
+        if job.update_type == "preferences":
+            existing_preferences = self.memory_manager.get_preferences(job.user_id)
+            with llm_priority(Priority.BACKGROUND):
+                result = self.preferences_llm.invoke(
+                    self._preferences_messages(state, existing_preferences)
+                )
+            self._save_preferences(job.user_id, result)
+        elif job.update_type == "ingredients":
+            existing_ingredients = self.memory_manager.get_ingredients(job.user_id)
+            with llm_priority(Priority.BACKGROUND):
+                result = self.ingredients_llm.invoke(
+                    self._ingredients_messages(state, existing_ingredients)
+                )
+            self._save_ingredients(job.user_id, result)
 
     def _route_message(
-        self, state: MessagesState, config: RunnableConfig, store: BaseStore
-    ) -> List[Literal["update_preferences", "update_ingredients", END]]:
+        self, state: AgentState, config: RunnableConfig, store: BaseStore
+    ) -> List[
+        Literal[
+            "update_preferences",
+            "update_ingredients",
+            "update_memory",
+            "schedule_memory_updates",
+            "find_recipes",
+            END,
+        ]
+    ]:
         """Route to appropriate nodes based on tool calls"""
         message = state["messages"][-1]
-        routes = []
 
         if not hasattr(message, "tool_calls") or not message.tool_calls:
             return [END]
 
-        for tool_call in message.tool_calls:
-            if tool_call["args"]["update_type"] == "preferences":
+        routes = []
+        for tool_call in self._memory_calls(state):
+            if tool_call["args"].get("update_type") == "preferences":
                 routes.append("update_preferences")
-            elif tool_call["args"]["update_type"] == "ingredients":
+            elif tool_call["args"].get("update_type") == "ingredients":
                 routes.append("update_ingredients")
+        routes = list(dict.fromkeys(routes))
+
+        if self.memory_queue is not None and self._memory_calls(state):
+            # Also answers UpdateMemory calls with a bad update_type
+            routes = ["schedule_memory_updates"]
+        elif self.merge_memory_updates and set(routes) == {
+            "update_preferences",
+            "update_ingredients",
+        }:
+            routes = ["update_memory"]
+
+        if self.recipe_index is not None and any(
+            tool_call["name"] == FindRecipes.__name__
+            for tool_call in message.tool_calls
+        ):
+            routes.append("find_recipes")
+
+        return routes or [END]
+
+    def invoke(self, messages, config, trace: Optional[TurnTrace] = None):
+        """Invoke the graph with the given messages and config.
 
-        if not routes:
-            routes.append(END)
+        Node, LLM and DB timings of the turn are recorded in `trace` (a new
+        one if None), logged, and added to the process-wide metrics.
+        """
+        with trace_turn(config, trace) as config:
+            return self.graph.invoke({"messages": messages}, config=config)
 
-        return routes
+    async def ainvoke(self, messages, config, trace: Optional[TurnTrace] = None):
+        """Invoke the graph asynchronously, requires an AsyncMemoryManager"""
+        with trace_turn(config, trace) as config:
+            return await self.graph.ainvoke({"messages": messages}, config=config)
 
-    def invoke(self, messages, config):
-        """Invoke the graph with the given messages and config"""
-        return self.graph.invoke({"messages": messages}, config=config)
+    @staticmethod
+    def _is_chat_token(chunk, metadata):
+        """Only chunks with text produced by the chat node are shown to the user"""
+        return metadata.get("langgraph_node") == "chat" and bool(chunk.content)
+
+    def stream(
+        self,
+        messages,
+        config,
+        stats: Optional[TurnStats] = None,
+        trace: Optional[TurnTrace] = None,
+    ):
+        """Stream the chat node's message chunks as they are generated.
+
+        A tool-routed turn runs the chat node more than once, so consumers
+        should start a new reply whenever the chunk id changes.
+        """
+        stats = stats or TurnStats()
+        stats.start()
+        with trace_turn(config, trace) as config:
+            for chunk, metadata in self.graph.stream(
+                {"messages": messages}, config=config, stream_mode="messages"
+            ):
+                if self._is_chat_token(chunk, metadata):
+                    stats.mark_token()
+                    yield chunk
+        stats.finish()
+
+    async def astream(
+        self,
+        messages,
+        config,
+        stats: Optional[TurnStats] = None,
+        trace: Optional[TurnTrace] = None,
+    ):
+        """Async version of `stream`, requires an AsyncMemoryManager"""
+        stats = stats or TurnStats()
+        stats.start()
+        with trace_turn(config, trace) as config:
+            async for chunk, metadata in self.graph.astream(
+                {"messages": messages}, config=config, stream_mode="messages"
+            ):
+                if self._is_chat_token(chunk, metadata):
+                    stats.mark_token()
+                    yield chunk
+        stats.finish()
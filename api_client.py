@@ -0,0 +1,91 @@
+import json
+from typing import Optional
+
+import httpx
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+
+from agent import TurnStats
+from models import Ingredients, Preferences
+from reasoning import REASONING_KEY, compress_reasoning
+
+
+class ChatAPIError(Exception):
+    """An error response or failed turn reported by the chat API server"""
+
+
+def _raise_for_error(response: httpx.Response):
+    if response.is_success:
+        return
+    response.read()
+    try:
+        message = response.json()["error"]
+    except (ValueError, KeyError, TypeError):
+        message = response.text or response.reason_phrase
+    raise ChatAPIError(f"{response.status_code}: {message}")
+
+
+class ChatAPIClient:
+    """Client of the chat API in server.py.
+
+    Has the MemoryManager read methods app.py uses, so the Streamlit app can
+    run as a thin client of a shared server instead of hosting the agent.
+    """
+
+    def __init__(self, base_url: str, timeout: float = 300.0):
+        self.http = httpx.Client(base_url=base_url.rstrip("/"), timeout=timeout)
+
+    def close(self):
+        self.http.close()
+
+    def _get(self, path, **params):
+        response = self.http.get(path, params=params)
+        _raise_for_error(response)
+        return response.json()
+
+    def get_preferences_model(self, user_id) -> Optional[Preferences]:
+        preferences = self._get(f"/users/{user_id}/memory")["preferences"]
+        return Preferences(**preferences) if preferences is not None else None
+
+    def get_ingredients_model(self, user_id) -> Optional[Ingredients]:
+        ingredients = self._get(f"/users/{user_id}/memory")["ingredients"]
+        return Ingredients(**ingredients) if ingredients is not None else None
+
+    def load_streamlit_messages(self, thread_id, limit=None, before_seq=None):
+        """The chat log as messages, like MemoryManager.load_streamlit_messages"""
+        params = {"limit": limit, "before": before_seq}
+        page = self._get(
+            f"/users/{thread_id}/history",
+            **{key: value for key, value in params.items() if value is not None},
+        )
+        messages = []
+        for row in page["messages"]:
+            kwargs = {"seq": row["seq"]}
+            if row["reasoning"]:
+                kwargs[REASONING_KEY] = compress_reasoning(row["reasoning"])
+            message_class = HumanMessage if row["role"] == "human" else AIMessage
+            messages.append(
+                message_class(content=row["content"], additional_kwargs=kwargs)
+            )
+        return messages
+
+    def stream(self, user_id, text, stats: Optional[TurnStats] = None):
+        """Send a message and yield the reply's chunks, like
+        IngredientTrackerAgent.stream. The server stores the turn."""
+        stats = stats or TurnStats()
+        stats.start()
+        with self.http.stream(
+            "POST", f"/users/{user_id}/chat", json={"message": text, "stream": True}
+        ) as response:
+            _raise_for_error(response)
+            event = None
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: ") :]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: ") :])
+                    if event == "token":
+                        stats.mark_token()
+                        yield AIMessageChunk(id=data["id"], content=data["content"])
+                    elif event == "error":
+                        raise ChatAPIError(data["error"])
+        stats.finish()
@@ -1,49 +1,86 @@
-import uuid
+import os
+import time
 
 import streamlit as st
 from dotenv import load_dotenv
 from langchain_core.messages import AIMessage, HumanMessage
 
-from agent import IngredientTrackerAgent
-from memory import MemoryManager
-from models import Ingredients, Preferences
+import resources
+from agent import TurnStats
+from api_client import ChatAPIClient, ChatAPIError
+from reasoning import (
+    DEFAULT_REASONING_STORAGE,
+    message_reasoning,
+    split_reasoning,
+    strip_reasoning,
+)
+from tracing import TurnTrace
 
 load_dotenv()
 
+HISTORY_PAGE_SIZE = 50
+
+# With CHAT_API_URL set the app is a thin client of server.py, which hosts
+# the agent and stores the chat log. Otherwise it runs the agent itself.
+CHAT_API_URL = os.getenv("CHAT_API_URL", "")
+
 st.set_page_config(page_title="Ingredient Tracker Chatbot", layout="wide")
 st.title("🍳 Ingredient Tracker Chatbot")
 
+session_started = time.perf_counter()
+
 if "memory_manager" not in st.session_state:
-    st.session_state.memory_manager = MemoryManager()
+    # The API client has the MemoryManager methods used below
+    st.session_state.memory_manager = (
+        ChatAPIClient(CHAT_API_URL)
+        if CHAT_API_URL
+        else resources.get_memory_manager()
+    )
 if "user_id" not in st.session_state:
-    st.session_state.user_id = "test_user"  # str(uuid.uuid4())
+    st.session_state.user_id = st.query_params.get("user", "test_user")
 if "chat_messages" not in st.session_state:
     st.session_state.chat_messages = (
         st.session_state.memory_manager.load_streamlit_messages(
-            st.session_state.user_id
+            st.session_state.user_id, limit=HISTORY_PAGE_SIZE
         )
         or []
     )
 if "agent" not in st.session_state:
-    st.session_state.agent = IngredientTrackerAgent(st.session_state.memory_manager)
+    st.session_state.agent = None if CHAT_API_URL else resources.get_agent()
+if "cold_start_time" not in st.session_state:
+    st.session_state.cold_start_time = time.perf_counter() - session_started
 if "placeholder" not in st.session_state:
     st.session_state.placeholder = None
+if "turn_stats" not in st.session_state:
+    st.session_state.turn_stats = []
+if "last_trace" not in st.session_state:
+    st.session_state.last_trace = None
 
 
 def get_preferences():
-    return st.session_state.memory_manager.get_preferences(st.session_state.user_id)
+    return st.session_state.memory_manager.get_preferences_model(
+        st.session_state.user_id
+    )
 
 
 def get_ingredients():
-    return st.session_state.memory_manager.get_ingredients(st.session_state.user_id)
+    return st.session_state.memory_manager.get_ingredients_model(
+        st.session_state.user_id
+    )
+
+
+def render_thinking(thinking_part):
+    st.markdown(
+        f'<div style="white-space: pre-wrap;">{thinking_part}</div>',
+        unsafe_allow_html=True,
+    )
 
 
 with st.sidebar:
     st.subheader("📋 Your Preferences")
-    preferences_data = get_preferences()
-    if preferences_data:
+    prefs = get_preferences()
+    if prefs:
         try:
-            prefs = Preferences.model_validate_json(preferences_data)
 
             if prefs.likes:
                 st.write("**Likes:**")
@@ -72,10 +109,9 @@ with st.sidebar:
         )
 
     st.subheader("🥕 Your Ingredients")
-    ingredients_data = get_ingredients()
-    if ingredients_data:
+    ingredients = get_ingredients()
+    if ingredients:
         try:
-            ingredients = Ingredients.model_validate_json(ingredients_data)
             for ingredient in ingredients.names:
                 st.write(f"- {ingredient}")
         except Exception as e:
@@ -85,27 +121,91 @@ with st.sidebar:
             "No ingredients saved yet. Tell the chatbot what ingredients you have!"
         )
 
+    st.caption(f"Session started in {st.session_state.cold_start_time:.2f}s")
+
+    agent = st.session_state.agent
+    if agent is not None:
+        if agent.memory_queue is not None:
+            queue_stats = agent.memory_queue.stats()
+            st.caption(
+                f"Memory updates: {queue_stats['depth']} queued, "
+                f"{queue_stats['in_flight']} running, "
+                f"lag {queue_stats['lag_seconds']:.1f}s"
+            )
+
+        prompt_stats = agent.prompt_monitor.stats()
+        if prompt_stats["calls"]:
+            st.caption(
+                f"Prompt tokens: {prompt_stats['prompt_tokens']}, "
+                f"reusable prefix {prompt_stats['reusable_ratio']:.0%}, "
+                f"reported cached {prompt_stats['cached_tokens']}"
+            )
+
+        if agent.extraction_cache is not None:
+            extraction_stats = agent.extraction_cache.stats()
+            if extraction_stats["lookups"]:
+                st.caption(
+                    f"Extraction cache: {extraction_stats['hit_rate']:.0%} hits "
+                    f"({extraction_stats['local_hits']} local, "
+                    f"{extraction_stats['db_hits']} database, "
+                    f"{extraction_stats['misses']} misses)"
+                )
+
+    if st.session_state.turn_stats:
+        last_turn = st.session_state.turn_stats[-1]
+        if last_turn.time_to_first_token is not None:
+            st.caption(
+                f"Last reply: first token after {last_turn.time_to_first_token:.2f}s, "
+                f"done after {last_turn.total_time:.2f}s"
+            )
+
+    last_trace = st.session_state.last_trace
+    if last_trace is not None and st.toggle("Show last turn breakdown"):
+        st.caption(
+            f"Turn took {last_trace.duration:.2f}s, "
+            f"{last_trace.prompt_tokens} prompt and "
+            f"{last_trace.completion_tokens} completion tokens"
+        )
+        st.table(
+            [
+                {
+                    "kind": row["kind"],
+                    "name": row["name"],
+                    "count": row["count"],
+                    "ms": round(row["seconds"] * 1000, 1),
+                }
+                for row in last_trace.breakdown()
+            ]
+        )
+
+
+def load_earlier_messages():
+    """Prepend the previous page of the chat log"""
+    first_seq = st.session_state.chat_messages[0].additional_kwargs.get("seq")
+    earlier = st.session_state.memory_manager.load_streamlit_messages(
+        st.session_state.user_id, limit=HISTORY_PAGE_SIZE, before_seq=first_seq
+    )
+    st.session_state.chat_messages = earlier + st.session_state.chat_messages
+
+
+if (
+    st.session_state.chat_messages
+    and st.session_state.chat_messages[0].additional_kwargs.get("seq", 1) > 1
+):
+    st.button("Load earlier messages", on_click=load_earlier_messages)
+
 for message in st.session_state.chat_messages:
     if isinstance(message, HumanMessage):
         with st.chat_message("user"):
             st.markdown(message.content)
     elif isinstance(message, AIMessage):
         with st.chat_message("assistant"):
-            if "<think>" in message.content and "</think>" in message.content:
-                thinking_part = (
-                    message.content.split("</think>")[0].replace("<think>", "").strip()
-                )
-                response_part = message.content.split("</think>")[1].strip()
-
+            thinking_part, response_part = message_reasoning(message)
+            if thinking_part is not None:
                 with st.expander("View thinking process"):
-                    st.markdown(
-                        f'<div style="white-space: pre-wrap;">{thinking_part}</div>',
-                        unsafe_allow_html=True,
-                    )
+                    render_thinking(thinking_part)
 
-                st.markdown(response_part)
-            else:
-                st.markdown(message.content)
+            st.markdown(response_part)
 
 if prompt := st.chat_input("What ingredients do you have?"):
     user_message = HumanMessage(content=prompt)
@@ -122,14 +222,62 @@ if prompt := st.chat_input("What ingredients do you have?"):
             }
         }
 
-        result = st.session_state.agent.invoke([user_message], config=config)
-        content = result["messages"][-1].content
+        thinking_placeholder = st.empty()
+        response_placeholder = st.empty()
+        stats = TurnStats()
+        trace = TurnTrace()
+        content = ""
+        message_id = None
 
-        st.session_state.placeholder = AIMessage(content=content)
-        st.session_state.chat_messages.append(st.session_state.placeholder)
-        st.session_state.memory_manager.save_streamlit_messages(
-            st.session_state.user_id, st.session_state.chat_messages
+        if st.session_state.agent is None:
+            chunks = st.session_state.memory_manager.stream(
+                st.session_state.user_id, prompt, stats=stats
+            )
+            trace = None
+        else:
+            chunks = st.session_state.agent.stream(
+                [user_message], config=config, stats=stats, trace=trace
+            )
+
+        try:
+            for chunk in chunks:
+                # The chat node runs again after a memory update, only the last
+                # reply is kept
+                if chunk.id != message_id:
+                    message_id = chunk.id
+                    content = ""
+                content += chunk.content
+
+                thinking_part, response_part = split_reasoning(content)
+                if thinking_part is not None:
+                    with thinking_placeholder.container():
+                        with st.expander("Thinking...", expanded=not response_part):
+                            render_thinking(thinking_part)
+                else:
+                    thinking_placeholder.empty()
+                response_placeholder.markdown(response_part)
+        except ChatAPIError as e:
+            st.error(f"The chat server could not answer: {e}")
+            st.stop()
+
+        st.session_state.turn_stats.append(stats)
+        st.session_state.last_trace = trace
+
+        # The server's agent keeps the default reasoning storage
+        st.session_state.placeholder = strip_reasoning(
+            AIMessage(content=content),
+            (
+                st.session_state.agent.reasoning_storage
+                if st.session_state.agent is not None
+                else DEFAULT_REASONING_STORAGE
+            ),
         )
+        st.session_state.chat_messages.append(st.session_state.placeholder)
+        # The server stores the turn itself
+        if st.session_state.agent is not None:
+            st.session_state.memory_manager.append_streamlit_messages(
+                st.session_state.user_id, [user_message, st.session_state.placeholder]
+            )
 
         with st.sidebar:
             st.rerun()
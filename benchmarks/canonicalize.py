@@ -0,0 +1,159 @@
+"""Ingredient canonicalization throughput on large synthetic inventories.
+
+Builds noisy inventories from the vocabulary in data/ingredients.txt: random
+casing, plurals, quantities and packaging, preparation words, aliases and
+single-letter typos. Reports names per second with a cold and a warm memo,
+how much deduplication shrinks the inventories and how many names came out
+as the vocabulary entry they were generated from. Usage:
+
+    python benchmarks/canonicalize.py --inventories 2000 --size 200
+"""
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from canonicalize import ALIASES, IngredientCanonicalizer  # noqa: E402
+
+QUANTITIES = ["", "", "2 ", "3 ", "500g ", "1 can of ", "a bag of ", "2 cups "]
+SUFFIXES = ["", "", "", " x2", " (organic)"]
+PREPARATION = ["", "", "", "fresh ", "chopped ", "large "]
+
+# Names whose filler words belong to the ingredient, checked before timing
+REGRESSIONS = {
+    "half and half": "half and half",
+    "Half & Half": "half and half",
+    "whole milk": "whole milk",
+    "2 cartons of Whole Milk": "whole milk",
+    "cinnamon sticks": "cinnamon stick",
+    "Garlic Cloves": "garlic",
+    "2 Cans of Chopped Tomatoes": "tomato",
+    "Red Onions x3": "red onion",
+    "minced beef": "ground beef",
+    "beef": "beef",
+}
+
+
+def pluralize(name):
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        return name[:-1] + "ies"
+    if name.endswith(("ch", "sh", "x")):
+        return name + "es"
+    return name + "s"
+
+
+def typo(name, rng):
+    """One substituted, dropped or doubled letter, away from the first one"""
+    if len(name) < 6:
+        return name
+    i = rng.randrange(1, len(name))
+    if name[i] == " " or name[i - 1] == " ":
+        return name
+    kind = rng.randrange(3)
+    if kind == 0:
+        return name[:i] + rng.choice(string.ascii_lowercase) + name[i + 1 :]
+    if kind == 1:
+        return name[:i] + name[i + 1 :]
+    return name[:i] + name[i] + name[i:]
+
+
+def noisy_name(canonical, aliases, rng, typo_rate):
+    """A free-text spelling of `canonical`, like the extraction model emits"""
+    name = rng.choice(aliases.get(canonical, []) + [canonical])
+    if rng.random() < 0.4:
+        name = pluralize(name)
+    if rng.random() < typo_rate:
+        name = typo(name, rng)
+    name = rng.choice(PREPARATION) + name
+    name = rng.choice([str.lower, str.title, str.capitalize, str.upper])(name)
+    return rng.choice(QUANTITIES) + name + rng.choice(SUFFIXES)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--inventories", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=60)
+    parser.add_argument("--typo-rate", type=float, default=0.1)
+    parser.add_argument("--cache-size", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    canonicalizer = IngredientCanonicalizer.from_file(cache_size=args.cache_size)
+    wrong = {
+        name: canonicalizer.canonicalize(name)
+        for name, expected in REGRESSIONS.items()
+        if canonicalizer.canonicalize(name) != expected
+    }
+    if wrong:
+        sys.exit(f"canonicalization regressions: {wrong}")
+    vocabulary = sorted(canonicalizer.vocabulary)
+    aliases = {}
+    for alias, name in ALIASES.items():
+        aliases.setdefault(canonicalizer.canonicalize(name), []).append(alias)
+
+    # Each inventory repeats a few dozen ingredients in many spellings
+    inventories = []
+    for _ in range(args.inventories):
+        items = rng.sample(vocabulary, args.distinct)
+        inventories.append(
+            [
+                (item, noisy_name(item, aliases, rng, args.typo_rate))
+                for item in rng.choices(items, k=args.size)
+            ]
+        )
+    names = [name for inventory in inventories for _, name in inventory]
+    print(
+        f"{len(inventories)} inventories, {len(names)} names, "
+        f"{len(set(names))} distinct spellings, vocabulary {len(vocabulary)}"
+    )
+
+    start = time.perf_counter()
+    for name in names:
+        canonicalizer._canonicalize(name)
+    cold = time.perf_counter() - start
+
+    for name in names:
+        canonicalizer.canonicalize(name)
+    start = time.perf_counter()
+    for name in names:
+        canonicalizer.canonicalize(name)
+    warm = time.perf_counter() - start
+
+    start = time.perf_counter()
+    deduped = [
+        canonicalizer.dedupe(name for _, name in inventory)
+        for inventory in inventories
+    ]
+    dedupe_time = time.perf_counter() - start
+
+    correct = sum(
+        canonicalizer.canonicalize(name) == item
+        for inventory in inventories
+        for item, name in inventory
+    )
+    before = sum(len(inventory) for inventory in inventories)
+    after = sum(len(inventory) for inventory in deduped)
+
+    print(f"{'':<24} {'names/s':>12} {'us/name':>9}")
+    for label, seconds in [("cold (no memo)", cold), ("warm (memoized)", warm)]:
+        print(
+            f"{label:<24} {len(names) / seconds:>12,.0f} "
+            f"{seconds / len(names) * 1e6:>9.2f}"
+        )
+    print(
+        f"dedupe: {before} -> {after} names ({after / before:.1%}, "
+        f"ideal {args.distinct / args.size:.1%}), "
+        f"{dedupe_time / len(inventories) * 1e3:.2f} ms per inventory"
+    )
+    print(f"accuracy: {correct / len(names):.2%} mapped to the generating entry")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Checkpoint table growth and compaction on a synthetic long history.
+
+Runs many tool-routed turns (chat -> update -> chat, five checkpoints each)
+through a small LangGraph graph for a number of threads, then reports the
+checkpoint table sizes and the time to load a thread's state, before and
+after `checkpoint_retention.compact` (plus VACUUM FULL). With --online the
+history is written through RetainingPostgresSaver instead, so it never
+grows. The compact CLI is checked to refuse --keep-last values below one
+first. Compaction prunes every thread in the database, use a scratch one:
+
+    python benchmarks/checkpoint_retention.py --db-uri postgresql://... \\
+        --threads 50 --turns 100 --keep-last 2
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.graph import START, MessagesState, StateGraph
+from psycopg.rows import dict_row
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from checkpoint_retention import (  # noqa: E402
+    RetainingPostgresSaver,
+    build_parser,
+    compact,
+    keep_last_arg,
+    print_sizes,
+    vacuum,
+)
+
+REPLY = "Noted, you have {}. " + "Here is a longer answer with a recipe idea. " * 8
+
+
+def build_graph(checkpointer):
+    """Same superstep shape as a tool-routed agent turn"""
+
+    def chat(state):
+        last = state["messages"][-1]
+        return {"messages": [AIMessage(REPLY.format(last.content))]}
+
+    def update(state):
+        return {"messages": [AIMessage("Memory updated.")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("chat", chat)
+    builder.add_node("update", update)
+    builder.add_node("reply", chat)
+    builder.add_edge(START, "chat")
+    builder.add_edge("chat", "update")
+    builder.add_edge("update", "reply")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def load_times(graph, threads):
+    times = []
+    for thread_id in threads:
+        start = time.perf_counter()
+        graph.get_state({"configurable": {"thread_id": thread_id}})
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def check_cli():
+    """compact --keep-last must refuse values that would prune everything"""
+    for retention in (None, 3):
+        parser = build_parser(retention)
+        args = parser.parse_args(["compact", "--keep-last", "2"])
+        assert args.keep_last == 2
+        for value in ("0", "-1", "two"):
+            try:
+                with contextlib.redirect_stderr(io.StringIO()):
+                    parser.parse_args(["compact", "--keep-last", value])
+            except SystemExit:
+                continue
+            sys.exit(f"compact --keep-last {value} was accepted")
+    assert build_parser(3).parse_args(["compact"]).keep_last == 3
+
+
+def main():
+    check_cli()
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-uri", required=True)
+    parser.add_argument("--threads", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=100)
+    parser.add_argument("--keep-last", type=keep_last_arg, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--online", action="store_true")
+    args = parser.parse_args()
+
+    with psycopg.connect(
+        args.db_uri, autocommit=True, prepare_threshold=0, row_factory=dict_row
+    ) as conn:
+        if args.online:
+            checkpointer = RetainingPostgresSaver(conn, keep_last=args.keep_last)
+        else:
+            checkpointer = PostgresSaver(conn)
+        checkpointer.setup()
+        graph = build_graph(checkpointer)
+        threads = [f"bench-{i}" for i in range(args.threads)]
+
+        start = time.perf_counter()
+        for turn in range(args.turns):
+            for thread_id in threads:
+                graph.invoke(
+                    {"messages": [HumanMessage(f"ingredient {turn}")]},
+                    {"configurable": {"thread_id": thread_id}},
+                )
+        print(
+            f"wrote {args.turns} turns for {args.threads} threads "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        before = graph.get_state({"configurable": {"thread_id": threads[0]}})
+
+        vacuum(conn, full=True)
+        print_sizes(conn, "before compaction")
+        print(f"  load state p50 {load_times(graph, threads):.2f} ms")
+
+        start = time.perf_counter()
+        result = compact(conn, args.keep_last, args.batch_size)
+        compaction_time = time.perf_counter() - start
+        vacuum(conn, full=True)
+        print(
+            f"compacted to {args.keep_last} per thread in {compaction_time:.2f}s: "
+            f"{result.checkpoints} checkpoints, {result.writes} writes, "
+            f"{result.blobs} blobs"
+        )
+        print_sizes(conn, "after compaction")
+        print(f"  load state p50 {load_times(graph, threads):.2f} ms")
+
+        after = graph.get_state({"configurable": {"thread_id": threads[0]}})
+        assert after.values == before.values, "compaction changed the latest state"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Session cold-start time, per-session resources versus shared resources.
+
+Needs the Postgres from the README running. Usage:
+
+    python benchmarks/cold_start.py --sessions 20
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import resources  # noqa: E402
+from agent import IngredientTrackerAgent  # noqa: E402
+from memory import (  # noqa: E402
+    CREATE_TABLES_SQL,
+    MIGRATE_INGREDIENTS_SQL,
+    MIGRATE_STREAMLIT_MESSAGES_SQL,
+    MemoryManager,
+)
+
+
+class PerSessionMemoryManager(MemoryManager):
+    """MemoryManager as sessions used to create it, running the checkpointer
+    setup and the memory DDL every time instead of skipping them when the
+    schema version is current"""
+
+    def _init_tables(self):
+        self.checkpointer.setup()
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor() as cur:
+                    cur.execute(CREATE_TABLES_SQL)
+                    cur.execute(MIGRATE_STREAMLIT_MESSAGES_SQL)
+                    cur.execute(MIGRATE_INGREDIENTS_SQL)
+
+
+def per_session_start():
+    """What every Streamlit session used to do"""
+    memory_manager = PerSessionMemoryManager()
+    IngredientTrackerAgent(memory_manager)
+    return memory_manager
+
+
+def shared_start():
+    resources.get_memory_manager()
+    resources.get_agent()
+
+
+def measure(start, sessions):
+    timings = []
+    for _ in range(sessions):
+        started = time.perf_counter()
+        start()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def report(name, timings, pools):
+    print(
+        f"{name:<12} first {timings[0] * 1000:8.1f} ms  "
+        f"median {statistics.median(timings) * 1000:8.1f} ms  "
+        f"total {sum(timings):6.2f} s  pools {pools}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=20)
+    args = parser.parse_args()
+
+    managers = []
+    timings = measure(lambda: managers.append(per_session_start()), args.sessions)
+    report("per-session", timings, pools=len(managers))
+    for memory_manager in managers:
+        memory_manager.close()
+
+    timings = measure(shared_start, args.sessions)
+    report("shared", timings, pools=1)
+    resources.close()
+
+
+if __name__ == "__main__":
+    main()
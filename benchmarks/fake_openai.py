@@ -0,0 +1,247 @@
+"""Deterministic fake OpenAI-compatible chat completions server.
+
+Answers POST /v1/chat/completions after a fixed latency with whatever the
+`responder` returns for the request body, streamed or not. Token counts are
+approximated from the characters in the request and reply.
+`ScriptedResponder` replays tool calls and structured outputs chosen by the
+user's message, enough to drive the agent through every graph path.
+"""
+
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def echo_responder(request):
+    return {"role": "assistant", "content": "ok"}
+
+
+def tool_call(name, arguments):
+    return {
+        "id": f"call_{uuid.uuid4().hex[:12]}",
+        "type": "function",
+        "function": {"name": name, "arguments": json.dumps(arguments)},
+    }
+
+
+# Structured outputs per response schema, for the agent's patch mode
+DEFAULT_EXTRACTIONS = {
+    "IngredientsPatch": {"add": ["tomato", "basil"], "remove": [], "rename": []},
+    "PreferencesPatch": {
+        field: {"add": items, "remove": [], "rename": []}
+        for field, items in [
+            ("likes", ["spicy food"]),
+            ("dislikes", []),
+            ("dietary_restrictions", ["vegetarian"]),
+            ("cooking_goals", []),
+        ]
+    },
+}
+DEFAULT_EXTRACTIONS["MemoryPatch"] = {
+    "preferences": DEFAULT_EXTRACTIONS["PreferencesPatch"],
+    "ingredients": DEFAULT_EXTRACTIONS["IngredientsPatch"],
+}
+
+# User message pattern -> tool calls the chat model makes for it
+DEFAULT_SCRIPT = [
+    (
+        r"\b(bought|have|got|used up|ran out)\b",
+        [("UpdateMemory", {"update_type": "ingredients"})],
+    ),
+    (
+        r"\b(love|like|hate|vegetarian|vegan|allergic)\b",
+        [("UpdateMemory", {"update_type": "preferences"})],
+    ),
+    (r"\b(cook|recipe|make)\b", [("FindRecipes", {"max_missing": 1})]),
+]
+
+
+class ScriptedResponder:
+    """Answers chat calls by script and extraction calls with fixed results.
+
+    On the first chat call of a turn, every script entry whose pattern
+    matches the last user message contributes its tool calls, if the tool
+    was offered. Calls after the tool results, and turns without a match,
+    get a plain reply of about `reply_tokens` tokens. Structured output
+    requests are answered from `extractions` by schema name.
+    """
+
+    def __init__(self, script=DEFAULT_SCRIPT, extractions=None, reply_tokens=60):
+        self.script = [(re.compile(pattern, re.I), calls) for pattern, calls in script]
+        self.extractions = extractions or DEFAULT_EXTRACTIONS
+        # About 8 tokens per sentence
+        sentences = max(1, reply_tokens // 8)
+        self.reply = " ".join(["Sounds good, here is an idea."] * sentences)
+
+    def __call__(self, request):
+        response_format = request.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            name = response_format["json_schema"].get("name")
+            return {"role": "assistant", "content": json.dumps(self.extractions[name])}
+
+        messages = request.get("messages", [])
+        users = [i for i, message in enumerate(messages) if message["role"] == "user"]
+        answered = users and any(
+            message["role"] == "tool" for message in messages[users[-1] :]
+        )
+        offered = {tool["function"]["name"] for tool in request.get("tools", [])}
+        if users and not answered:
+            text = messages[users[-1]]["content"]
+            calls = [
+                tool_call(name, arguments)
+                for pattern, entries in self.script
+                if pattern.search(text)
+                for name, arguments in entries
+                if name in offered
+            ]
+            if calls:
+                return {"role": "assistant", "content": None, "tool_calls": calls}
+        return {"role": "assistant", "content": self.reply}
+
+
+def _tokens(text):
+    return max(1, len(text) // 4)
+
+
+class FakeOpenAIServer:
+    def __init__(self, responder=echo_responder, latency: float = 0.05):
+        self.responder = responder
+        self.latency = latency
+        self.requests = 0
+        self.max_concurrent = 0
+        self._concurrent = 0
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _track(self, delta):
+        with self._lock:
+            self._concurrent += delta
+            if delta > 0:
+                self.requests += 1
+                self.max_concurrent = max(self.max_concurrent, self._concurrent)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("content-length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                server._track(1)
+                try:
+                    time.sleep(server.latency)
+                    message = server.responder(body)
+                finally:
+                    server._track(-1)
+
+                prompt = json.dumps(body.get("messages", []))
+                usage = {
+                    "prompt_tokens": _tokens(prompt),
+                    "completion_tokens": _tokens(json.dumps(message)),
+                }
+                usage["total_tokens"] = usage["prompt_tokens"] + usage[
+                    "completion_tokens"
+                ]
+
+                if body.get("stream"):
+                    self._stream(body, message, usage)
+                else:
+                    self._send_json(
+                        {
+                            "id": f"chatcmpl-{uuid.uuid4().hex}",
+                            "object": "chat.completion",
+                            "created": int(time.time()),
+                            "model": body.get("model", "fake"),
+                            "choices": [
+                                {
+                                    "index": 0,
+                                    "message": message,
+                                    "finish_reason": finish_reason(message),
+                                }
+                            ],
+                            "usage": usage,
+                        }
+                    )
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, message, usage):
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.send_header("connection", "close")
+                self.end_headers()
+
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+                def chunk(delta, finish=None, chunk_usage=None):
+                    payload = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": body.get("model", "fake"),
+                        "choices": (
+                            []
+                            if delta is None
+                            else [{"index": 0, "delta": delta, "finish_reason": finish}]
+                        ),
+                    }
+                    if chunk_usage is not None:
+                        payload["usage"] = chunk_usage
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                    self.wfile.flush()
+
+                chunk({"role": "assistant", "content": ""})
+                content = message.get("content") or ""
+                for start in range(0, len(content), 8):
+                    chunk({"content": content[start : start + 8]})
+                for index, tool_call in enumerate(message.get("tool_calls") or []):
+                    chunk({"tool_calls": [{"index": index, **tool_call}]})
+                chunk({}, finish=finish_reason(message))
+                if body.get("stream_options", {}).get("include_usage"):
+                    chunk(None, chunk_usage=usage)
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+                self.close_connection = True
+
+        return Handler
+
+
+def finish_reason(message):
+    return "tool_calls" if message.get("tool_calls") else "stop"
@@ -0,0 +1,92 @@
+"""Queue time of interactive versus background LLM calls under load.
+
+Starts fake OpenAI-compatible backends with a fixed latency and fires a
+mix of chat (interactive) and extraction (background) requests through the
+LLMScheduler, the same way the agent's ChatOpenAI client does. Usage:
+
+    python benchmarks/llm_scheduler.py --backends 2 --max-in-flight 2
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from langchain_openai import ChatOpenAI  # noqa: E402
+
+from benchmarks.fake_openai import FakeOpenAIServer  # noqa: E402
+from llm_scheduler import (  # noqa: E402
+    SCHEDULER_BASE_URL,
+    LLMScheduler,
+    Priority,
+    SchedulingTransport,
+    llm_priority,
+)
+
+
+def run(model, priority):
+    start = time.perf_counter()
+    with llm_priority(priority):
+        model.invoke("What can I cook tonight?")
+    return priority, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backends", type=int, default=2)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--interactive", type=int, default=40)
+    parser.add_argument("--background", type=int, default=80)
+    args = parser.parse_args()
+
+    servers = [
+        FakeOpenAIServer(latency=args.latency).start() for _ in range(args.backends)
+    ]
+    scheduler = LLMScheduler(
+        [server.url for server in servers], max_in_flight=args.max_in_flight
+    )
+    model = ChatOpenAI(
+        model="fake",
+        base_url=SCHEDULER_BASE_URL,
+        api_key="not-needed",
+        http_client=httpx.Client(transport=SchedulingTransport(scheduler)),
+    )
+
+    # Background work is submitted first, as a burst of extraction calls
+    # would be, interactive requests arrive while it is queued
+    priorities = [Priority.BACKGROUND] * args.background + [
+        Priority.INTERACTIVE
+    ] * args.interactive
+    with ThreadPoolExecutor(max_workers=len(priorities)) as pool:
+        results = list(pool.map(lambda p: run(model, p), priorities))
+
+    for server in servers:
+        server.stop()
+
+    print(f"{'priority':<12} {'requests':>8} {'p50 (s)':>8} {'p95 (s)':>8}")
+    for priority in Priority:
+        latencies = sorted(t for p, t in results if p == priority)
+        if not latencies:
+            continue
+        p95 = latencies[int(0.95 * (len(latencies) - 1))]
+        print(
+            f"{priority.name.lower():<12} {len(latencies):>8} "
+            f"{statistics.median(latencies):>8.3f} {p95:>8.3f}"
+        )
+
+    print(
+        "max concurrent per backend:",
+        [server.max_concurrent for server in servers],
+    )
+    print(json.dumps(scheduler.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
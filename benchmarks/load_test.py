@@ -0,0 +1,242 @@
+"""End-to-end load test of the agent against a fake LLM and a real Postgres.
+
+N simulated users chat concurrently through `IngredientTrackerAgent.invoke`
+with one shared MemoryManager (its pool holds at most 5 connections). The
+fake OpenAI server replays scripted tool calls after a fixed latency, so the
+LLM side is deterministic and the numbers show the agent and database
+overhead. Every turn is traced; the report has per-turn latency percentiles,
+DB statements and pool waits, LLM calls and tokens, and throughput. It writes
+memory rows for the synthetic users, use a scratch database:
+
+    python benchmarks/load_test.py --db-uri postgresql://... --users 8 \\
+        --turns 20 --output results.json [--compare baseline.json]
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+import agent as agent_module  # noqa: E402
+import memory  # noqa: E402
+from benchmarks.fake_openai import FakeOpenAIServer, ScriptedResponder  # noqa: E402
+from recipes import RecipeIndex  # noqa: E402
+from tracing import TurnTrace  # noqa: E402
+
+# One conversation, cycled through by every user. Covers a plain reply, each
+# memory update path and the recipe tool.
+CONVERSATION = [
+    "Hi! How are you today?",
+    "I bought tomatoes, basil, mozzarella and a bag of pasta",
+    "I love spicy food, and I'm vegetarian",
+    "Thanks, that sounds great.",
+    "I used up the basil and got some garlic and onions",
+    "Can you suggest a recipe I could cook right now?",
+]
+
+# Summary values where lower is better, compared against a baseline
+COMPARED = [
+    "latency_p50",
+    "latency_p95",
+    "db_statements_per_turn",
+    "pool_wait_p95",
+    "llm_calls_per_turn",
+    "tokens_per_turn",
+]
+
+POOL_STATS = ["pool_max", "connections_num", "requests_num", "requests_wait_ms"]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[round(fraction * (len(values) - 1))] if values else 0.0
+
+
+def turn_record(trace: TurnTrace, message):
+    rows = trace.breakdown()
+
+    def total(kind, key):
+        return sum(row[key] for row in rows if row["kind"] == kind)
+
+    return {
+        "message": message,
+        "latency": trace.duration,
+        "db_statements": total("db", "count"),
+        "db_seconds": total("db", "seconds"),
+        "pool_waits": total("pool_wait", "count"),
+        "pool_wait_seconds": total("pool_wait", "seconds"),
+        "llm_calls": total("llm", "count"),
+        "llm_seconds": total("llm", "seconds"),
+        "prompt_tokens": trace.prompt_tokens,
+        "completion_tokens": trace.completion_tokens,
+        "nodes": [row["name"] for row in rows if row["kind"] == "node"],
+    }
+
+
+def simulate_user(agent, user_id, turns, records, errors):
+    config = {"configurable": {"user_id": user_id, "thread_id": user_id}}
+    for turn in range(turns):
+        message = CONVERSATION[turn % len(CONVERSATION)]
+        trace = TurnTrace()
+        try:
+            agent.invoke([HumanMessage(content=message)], config, trace=trace)
+        except Exception as e:
+            errors.append(f"{user_id}: {e!r}")
+            continue
+        records.append(turn_record(trace, message))
+
+
+def summarize(records, wall_time):
+    def mean(key):
+        return statistics.mean(record[key] for record in records)
+
+    latencies = [record["latency"] for record in records]
+    return {
+        "turns": len(records),
+        "wall_time": wall_time,
+        "throughput_turns_per_second": len(records) / wall_time,
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_max": max(latencies),
+        "db_statements_per_turn": mean("db_statements"),
+        "db_seconds_per_turn": mean("db_seconds"),
+        "pool_wait_p95": percentile([r["pool_wait_seconds"] for r in records], 0.95),
+        "llm_calls_per_turn": mean("llm_calls"),
+        "prompt_tokens_per_turn": mean("prompt_tokens"),
+        "completion_tokens_per_turn": mean("completion_tokens"),
+        "tokens_per_turn": mean("prompt_tokens") + mean("completion_tokens"),
+    }
+
+
+def by_message(records):
+    """Summary per conversation step, each takes a different graph path"""
+    steps = {}
+    for message in CONVERSATION:
+        step = [record for record in records if record["message"] == message]
+        if step:
+            steps[message] = {
+                "turns": len(step),
+                "latency_p50": percentile([r["latency"] for r in step], 0.5),
+                "db_statements": statistics.mean(r["db_statements"] for r in step),
+                "llm_calls": statistics.mean(r["llm_calls"] for r in step),
+                "nodes": step[0]["nodes"],
+            }
+    return steps
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(summary, baseline_path):
+    baseline = json.loads(Path(baseline_path).read_text())["summary"]
+    print(f"\n{'vs ' + baseline_path:<28} {'baseline':>10} {'now':>10} {'change':>8}")
+    for key in COMPARED + ["throughput_turns_per_second"]:
+        before, now = baseline.get(key), summary[key]
+        if not before:
+            continue
+        print(f"{key:<28} {before:>10.4g} {now:>10.4g} {now / before - 1:>+8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-uri", required=True)
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--recipes", default=str(ROOT / "data" / "recipes.jsonl"))
+    parser.add_argument("--output", default="load_test_results.json")
+    parser.add_argument("--compare")
+    args = parser.parse_args()
+
+    memory.DB_URI = args.db_uri
+    memory_manager = memory.MemoryManager()
+    server = FakeOpenAIServer(
+        ScriptedResponder(reply_tokens=args.reply_tokens), latency=args.latency
+    ).start()
+    agent_module.MODEL_BASE_URL = server.url
+    agent = agent_module.IngredientTrackerAgent(
+        memory_manager,
+        recipe_index=RecipeIndex.from_jsonl(args.recipes) if args.recipes else None,
+    )
+
+    run_id = int(time.time())
+    records, errors = [], []
+    threads = [
+        threading.Thread(
+            target=simulate_user,
+            args=(agent, f"load-{run_id}-{i}", args.turns, records, errors),
+        )
+        for i in range(args.users)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall_time = time.perf_counter() - start
+
+    server.stop()
+    pool_stats = memory_manager.pool.get_stats()
+    memory_manager.close()
+    if not records:
+        sys.exit(f"every turn failed: {errors[:3]}")
+
+    summary = summarize(records, wall_time)
+    results = {
+        "benchmark": "load_test",
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "config": {
+            key: value for key, value in vars(args).items() if key != "db_uri"
+        },
+        "summary": summary,
+        "steps": by_message(records),
+        "llm_requests": server.requests,
+        "llm_max_concurrent": server.max_concurrent,
+        "pool": {key: pool_stats.get(key) for key in POOL_STATS},
+        "errors": errors,
+    }
+    Path(args.output).write_text(json.dumps(results, indent=2))
+
+    print(
+        f"{args.users} users x {args.turns} turns, LLM latency {args.latency}s, "
+        f"{len(errors)} errors, results in {args.output}"
+    )
+    for key, value in summary.items():
+        print(f"  {key:<28} {value:>10.4g}")
+    print(f"\n{'step':<48} {'p50 (s)':>8} {'db':>6} {'llm':>5}  nodes")
+    for message, step in results["steps"].items():
+        print(
+            f"{message[:47]:<48} {step['latency_p50']:>8.3f} "
+            f"{step['db_statements']:>6.1f} {step['llm_calls']:>5.1f}  "
+            f"{' '.join(step['nodes'])}"
+        )
+    if args.compare:
+        compare(summary, args.compare)
+
+
+if __name__ == "__main__":
+    main()
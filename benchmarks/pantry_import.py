@@ -0,0 +1,114 @@
+"""Bulk pantry import versus adding items one at a time.
+
+Generates a CSV grocery haul of noisy names (see benchmarks/canonicalize.py)
+for many users, then times parsing it and importing it with
+`MemoryManager.import_pantry_items` (one COPY and one transaction), a second
+import of the same file where every item already exists, and
+`add_ingredient` per item for a few users as the baseline. Checks that
+cached ingredients of the imported users were refreshed. Writes pantry rows
+for its users, use a scratch database:
+
+    python benchmarks/pantry_import.py --db-uri postgresql://... \\
+        --users 2000 --items 20
+"""
+
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import memory  # noqa: E402
+from benchmarks.canonicalize import noisy_name  # noqa: E402
+from canonicalize import ALIASES, shared_canonicalizer  # noqa: E402
+from pantry_import import parse_csv  # noqa: E402
+
+
+def haul_csv(users, items, rng, prefix):
+    """CSV of `items` noisy names for each of `users` users"""
+    vocabulary = sorted(shared_canonicalizer.vocabulary)
+    aliases = {}
+    for alias, name in ALIASES.items():
+        aliases.setdefault(shared_canonicalizer.canonicalize(name), []).append(alias)
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(["user_id", "name"])
+    for user in range(users):
+        for item in rng.sample(vocabulary, items):
+            writer.writerow([f"{prefix}-{user}", noisy_name(item, aliases, rng, 0.1)])
+    return out.getvalue()
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--db-uri", required=True)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--items", type=int, default=20)
+    parser.add_argument("--baseline-users", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    prefix = f"import-{int(time.time())}"
+    data = haul_csv(args.users, args.items, rng, prefix)
+
+    memory.DB_URI = args.db_uri
+    memory_manager = memory.MemoryManager()
+    try:
+        # Cached before the import, must not be served stale afterwards
+        sampled = [f"{prefix}-{user}" for user in range(0, args.users, 97)]
+        for user_id in sampled:
+            memory_manager.get_ingredients_model(user_id)
+
+        items, parse_time = timed(parse_csv, data)
+        print(
+            f"{len(items)} items for {args.users} users, "
+            f"parsed in {parse_time:.2f}s"
+        )
+
+        print(f"{'':<28} {'seconds':>8} {'items/s':>10}  result")
+        for label in ("bulk import", "bulk import again"):
+            result, seconds = timed(memory_manager.import_pantry_items, items)
+            print(
+                f"{label:<28} {seconds:>8.2f} {len(items) / seconds:>10,.0f}  "
+                f"{result['inserted']} new, {result['updated']} existing"
+            )
+
+        baseline = [
+            item.model_copy(update={"user_id": f"{item.user_id}-one-by-one"})
+            for item in items[: args.baseline_users * args.items]
+        ]
+        start = time.perf_counter()
+        for item in baseline:
+            memory_manager.add_ingredient(item.user_id, item.name, item.quantity)
+        seconds = time.perf_counter() - start
+        print(
+            f"{'add_ingredient per item':<28} {seconds:>8.2f} "
+            f"{len(baseline) / seconds:>10,.0f}  {args.baseline_users} users"
+        )
+
+        stale = 0
+        for user_id in sampled:
+            expected = shared_canonicalizer.dedupe(
+                item.name for item in items if item.user_id == user_id
+            )
+            ingredients = memory_manager.get_ingredients_model(user_id)
+            stale += ingredients is None or ingredients.names != expected
+        print(f"cache: {stale} of {len(sampled)} sampled users stale after import")
+    finally:
+        memory_manager.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Precision/recall of the lexicon pre-router on labeled fixture sets.
+
+prerouter_messages.jsonl is the set the lexicon was tuned on,
+prerouter_heldout.jsonl is kept out of tuning to catch overfitting.
+
+Positive means "UpdateMemory may apply". With --measure-llm the chat model is
+also timed with and without the tool schema on the messages the router
+rejects, which is the latency the pre-router saves. Usage:
+
+    python benchmarks/prerouter.py [--measure-llm]
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from prerouter import LexiconPreRouter  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+FIXTURE_SETS = {
+    "tuning": FIXTURES / "prerouter_messages.jsonl",
+    "held-out": FIXTURES / "prerouter_heldout.jsonl",
+}
+
+
+def load_fixtures(path=FIXTURE_SETS["tuning"]):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def evaluate(router, samples):
+    tp = fp = fn = tn = 0
+    mistakes = []
+    started = time.perf_counter()
+    for sample in samples:
+        predicted = router.memory_may_apply(sample["text"])
+        if predicted and sample["memory"]:
+            tp += 1
+        elif predicted:
+            fp += 1
+        elif sample["memory"]:
+            fn += 1
+        else:
+            tn += 1
+        if predicted != sample["memory"]:
+            mistakes.append((sample["memory"], sample["text"]))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "samples": len(samples),
+        "precision": tp / (tp + fp) if tp + fp else 0.0,
+        "recall": tp / (tp + fn) if tp + fn else 0.0,
+        "tool_calls_skipped": (tn + fn) / len(samples),
+        "classify_us": elapsed / len(samples) * 1e6,
+        "mistakes": mistakes,
+    }
+
+
+def measure_llm(texts, repeats):
+    """Median chat latency with and without the UpdateMemory tool schema"""
+    from langchain_core.messages import HumanMessage, SystemMessage
+    from langchain_openai import ChatOpenAI
+
+    from agent import MODEL_BASE_URL, MODEL_NAME
+    from models import UpdateMemory
+    from prompts import MODEL_MEMORY_MESSAGE, MODEL_SYSTEM_MESSAGE
+
+    model = ChatOpenAI(
+        model=MODEL_NAME, temperature=0, base_url=MODEL_BASE_URL, api_key="not-needed"
+    )
+    with_tools = model.bind_tools([UpdateMemory], parallel_tool_calls=True)
+    system = SystemMessage(content=MODEL_SYSTEM_MESSAGE)
+    memory = SystemMessage(
+        content=MODEL_MEMORY_MESSAGE.format(user_preferences=None, ingredients=None)
+    )
+
+    timings = {"with_tools": [], "without_tools": []}
+    for _ in range(repeats):
+        for text in texts:
+            messages = [system, HumanMessage(content=text), memory]
+            for name, llm in (("with_tools", with_tools), ("without_tools", model)):
+                started = time.perf_counter()
+                llm.invoke(messages)
+                timings[name].append(time.perf_counter() - started)
+    return {name: statistics.median(values) for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--measure-llm", action="store_true")
+    parser.add_argument("--repeats", type=int, default=1)
+    args = parser.parse_args()
+
+    router = LexiconPreRouter()
+    for name, path in FIXTURE_SETS.items():
+        result = evaluate(router, load_fixtures(path))
+        print(f"[{name}]")
+        print(f"samples            {result['samples']}")
+        print(f"precision          {result['precision']:.3f}")
+        print(f"recall             {result['recall']:.3f}")
+        print(f"tool schema left out {result['tool_calls_skipped']:.1%} of turns")
+        print(f"classify           {result['classify_us']:.1f} us/message")
+        for expected, text in result["mistakes"]:
+            kind = "missed" if expected else "false positive"
+            print(f"  {kind}: {text}")
+
+    samples = load_fixtures()
+
+    if args.measure_llm:
+        rejected = [
+            s["text"] for s in samples if not router.memory_may_apply(s["text"])
+        ]
+        timings = measure_llm(rejected, args.repeats)
+        saved = timings["with_tools"] - timings["without_tools"]
+        print(f"chat with tools    {timings['with_tools'] * 1000:.0f} ms median")
+        print(f"chat without tools {timings['without_tools'] * 1000:.0f} ms median")
+        print(f"saved per skipped turn {saved * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Recipe matching latency on a large synthetic corpus.
+
+Generates recipes over a Zipf-distributed ingredient vocabulary, builds the
+bitset RecipeIndex and times "cookable now" and "missing <= k" queries for
+random pantries, against a plain Python set scan of the same corpus. First
+checks restriction and must_use regressions on the bundled recipes. Usage:
+
+    python benchmarks/recipe_index.py --recipes 200000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from recipes import Recipe, RecipeIndex  # noqa: E402
+
+TAGS = ["vegetarian", "vegan", "gluten-free", "dairy-free", "pescatarian"]
+
+RECIPES = Path(__file__).resolve().parent.parent / "data" / "recipes.jsonl"
+
+# Restrictions on the bundled recipes, to recipes they must rule out
+RESTRICTION_REGRESSIONS = {
+    "nut allergy": ["Peanut noodles"],
+    "shellfish allergy": ["Garlic shrimp pasta"],
+    "no seafood": [
+        "Garlic shrimp pasta",
+        "Salmon with roasted vegetables",
+        "Tuna pasta salad",
+        "Fish tacos",
+    ],
+    "no pork": ["Sausage and peppers", "Spaghetti carbonara", "Pork chops with apples"],
+    "kosher": ["Spaghetti carbonara", "Garlic shrimp pasta", "Beef tacos"],
+    "halal": ["Sausage and peppers", "Mushroom risotto"],
+    "low carb": ["Spaghetti carbonara", "Egg fried rice", "Pancakes"],
+    "I'm on a keto diet": ["Baked potatoes with beans", "Banana oat pancakes"],
+}
+
+# must_use terms on the bundled recipes, to recipes they must find
+MUST_USE_REGRESSIONS = {
+    "chicken": ["Chicken stir fry", "Chicken curry", "Fried rice with chicken"],
+    "beans": ["Vegetable chili", "Baked potatoes with beans"],
+}
+
+
+def ingredient_name(i):
+    """Letters only, canonicalization drops digits"""
+    letters = ""
+    while True:
+        i, rest = divmod(i, 26)
+        letters += chr(ord("a") + rest)
+        if not i:
+            return f"ingredient {letters}"
+
+
+def synthetic_recipes(count, vocabulary_size, rng):
+    vocabulary = [ingredient_name(i) for i in range(vocabulary_size)]
+    # Few ingredients are in most recipes, most are rare, like real corpora
+    weights = 1 / np.arange(1, vocabulary_size + 1)
+    weights /= weights.sum()
+    np_rng = np.random.default_rng(rng.randrange(2**32))
+
+    recipes = []
+    for i in range(count):
+        size = rng.randint(4, 14)
+        ids = np_rng.choice(vocabulary_size, size=size, replace=False, p=weights)
+        recipes.append(
+            Recipe(
+                name=f"recipe {i}",
+                ingredients=[vocabulary[j] for j in ids],
+                tags=rng.sample(TAGS, rng.randint(0, 2)),
+            )
+        )
+    return vocabulary, recipes
+
+
+def scan(index, pantry, max_missing, excluded, limit):
+    """The straightforward version: set differences recipe by recipe"""
+    pantry = {index.canonicalize(name) for name in pantry}
+    excluded = {index.canonicalize(name) for name in excluded}
+    matches = []
+    for recipe in index.recipes:
+        needed = {index.canonicalize(name) for name in recipe.ingredients}
+        if needed & excluded:
+            continue
+        missing = needed - pantry
+        if len(missing) <= max_missing:
+            matches.append((len(missing), -len(needed & pantry), recipe.name))
+    return sorted(matches)[:limit]
+
+
+def check_regressions():
+    index = RecipeIndex.from_jsonl(RECIPES)
+    pantry = index.names
+    wrong = {}
+    for restriction, ruled_out in RESTRICTION_REGRESSIONS.items():
+        matches = index.search(
+            pantry, max_missing=100, dietary_restrictions=[restriction], limit=100
+        )
+        kept = {match.recipe.name for match in matches} & set(ruled_out)
+        if kept or index.unrecognized_restrictions([restriction]):
+            wrong[restriction] = sorted(kept) or "unrecognized"
+    for term, expected in MUST_USE_REGRESSIONS.items():
+        matches = index.search(pantry, max_missing=100, must_use=[term], limit=100)
+        missed = set(expected) - {match.recipe.name for match in matches}
+        if missed:
+            wrong[f"must use {term}"] = sorted(missed)
+    if wrong:
+        sys.exit(f"recipe search regressions: {wrong}")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[int(fraction * (len(values) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--recipes", type=int, default=200_000)
+    parser.add_argument("--vocabulary", type=int, default=3000)
+    parser.add_argument("--pantry-size", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--scan-queries", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    check_regressions()
+
+    rng = random.Random(args.seed)
+    vocabulary, recipes = synthetic_recipes(args.recipes, args.vocabulary, rng)
+
+    start = time.perf_counter()
+    index = RecipeIndex(recipes, staples=())
+    build_time = time.perf_counter() - start
+    print(
+        f"{len(recipes)} recipes, {len(index.vocabulary)} ingredients, "
+        f"built in {build_time:.2f}s, bitsets {index.bits.nbytes / 1e6:.1f} MB"
+    )
+
+    # Pantries lean towards common ingredients, as real ones do
+    common = vocabulary[: args.vocabulary // 10]
+    pantries = [
+        rng.sample(common, args.pantry_size // 2)
+        + rng.sample(vocabulary, args.pantry_size // 2)
+        for _ in range(args.queries)
+    ]
+    dislikes = [vocabulary[7]]
+
+    print(f"{'query':<28} {'p50 (ms)':>9} {'p95 (ms)':>9} {'matches':>8}")
+    for label, max_missing, restrictions in [
+        ("cookable now", 0, []),
+        ("missing <= 2", 2, []),
+        ("missing <= 2, vegetarian", 2, ["vegetarian"]),
+    ]:
+        times, found = [], []
+        for pantry in pantries:
+            start = time.perf_counter()
+            matches = index.search(
+                pantry,
+                max_missing=max_missing,
+                dislikes=dislikes,
+                dietary_restrictions=restrictions,
+                limit=10,
+            )
+            times.append((time.perf_counter() - start) * 1000)
+            found.append(len(matches))
+        print(
+            f"{label:<28} {statistics.median(times):>9.2f} "
+            f"{percentile(times, 0.95):>9.2f} {statistics.mean(found):>8.1f}"
+        )
+
+    # The set scan is slow, so only a few queries, also checking the results
+    scan_times = []
+    for pantry in pantries[: args.scan_queries]:
+        start = time.perf_counter()
+        expected = scan(index, set(pantry), 2, set(dislikes), 10)
+        scan_times.append((time.perf_counter() - start) * 1000)
+        matches = index.search(pantry, max_missing=2, dislikes=dislikes, limit=10)
+        assert [len(m.missing) for m in matches] == [e[0] for e in expected]
+    print(f"{'python set scan, <= 2':<28} {statistics.median(scan_times):>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
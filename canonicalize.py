@@ -0,0 +1,281 @@
+import re
+import unicodedata
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from models import Ingredients, IngredientsPatch, Rename
+
+VOCABULARY_PATH = Path(__file__).resolve().parent / "data" / "ingredients.txt"
+
+WORDS = re.compile(r"[a-z]+(?:-[a-z]+)*")
+
+# Counts and packaging, and preparation, that don't change what the
+# ingredient is: "2 cans of chopped tomatoes" -> "tomato". Only stripped
+# around a name, never inside it: "half and half", "whole milk".
+COUNT_WORDS = frozenset(
+    """
+    a an the of some few couple dozen half whole x g kg mg ml l cl dl lb lbs
+    oz cup cups tbsp tsp can cans tin tins jar jars bag bags bunch bunches pack
+    packs packet packets box boxes bottle bottles carton cartons piece pieces
+    slice slices clove cloves handful handfuls pinch head heads stick sticks
+    loaf block blocks tub tubs
+    """.split()
+)
+PREPARATION_WORDS = frozenset(
+    """
+    fresh organic large small medium big chopped diced sliced minced grated
+    shredded peeled leftover
+    """.split()
+)
+FILLER_WORDS = COUNT_WORDS | PREPARATION_WORDS
+# Always a quantity or preparation after a name, "onions x3", "basil (fresh)".
+# Packaging after a name is part of it unless the rest is in the vocabulary:
+# "garlic cloves" -> "garlic", but "cinnamon sticks" -> "cinnamon stick".
+TRAILING_WORDS = (
+    frozenset("x g kg mg ml l cl dl lb lbs oz".split()) | PREPARATION_WORDS
+)
+
+# Plurals the suffix rules get wrong, and words that only look plural
+IRREGULAR_PLURALS = {
+    "leaves": "leaf",
+    "loaves": "loaf",
+    "halves": "half",
+    "cookies": "cookie",
+    "brownies": "brownie",
+    "pies": "pie",
+    "smoothies": "smoothie",
+    "anchovies": "anchovy",
+    "chilies": "chili",
+    "chillies": "chili",
+    "bries": "brie",
+}
+INVARIANT_WORDS = frozenset(
+    "asparagus hummus couscous molasses swiss grits citrus octopus".split()
+)
+
+# Regional and alternative names, mapped after singularization
+ALIASES = {
+    "aubergine": "eggplant",
+    "courgette": "zucchini",
+    "capsicum": "bell pepper",
+    "coriander": "cilantro",
+    "scallion": "green onion",
+    "spring onion": "green onion",
+    "garbanzo bean": "chickpea",
+    "garbanzo": "chickpea",
+    "prawn": "shrimp",
+    "yoghurt": "yogurt",
+    "minced beef": "ground beef",
+    "beef mince": "ground beef",
+    "mince": "ground beef",
+    "rocket": "arugula",
+    "chilli": "chili",
+    "chili pepper": "chili",
+    "icing sugar": "powdered sugar",
+    "caster sugar": "sugar",
+    "double cream": "heavy cream",
+    "bicarbonate of soda": "baking soda",
+    "mayo": "mayonnaise",
+    "half & half": "half and half",
+}
+
+
+def singularize(word: str) -> str:
+    if word in IRREGULAR_PLURALS:
+        return IRREGULAR_PLURALS[word]
+    if len(word) <= 3 or word in INVARIANT_WORDS or word.endswith(("ss", "us", "is")):
+        return word
+    if word.endswith("ies"):
+        return word[:-3] + "y"
+    if word.endswith(("ches", "shes", "xes", "sses", "oes")):
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def _words(name: str):
+    """Lower-case ASCII words, "Crème fraîche" -> ["creme", "fraiche"]"""
+    ascii_name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore")
+    return WORDS.findall(ascii_name.decode().lower())
+
+
+def _singular_phrase(words):
+    if not words:
+        return ""
+    return " ".join(words[:-1] + [singularize(words[-1])])
+
+
+def _phrase(name: str) -> str:
+    """All words of a name, singular last word: "Whole Milk" -> "whole milk" """
+    return _singular_phrase(_words(name))
+
+
+def normalize_ingredient(name: str) -> str:
+    """Lower case, no leading quantity or packaging, singular last word.
+
+    "2 Cans of Chopped Tomatoes" -> "tomato", "Red Onions x3" -> "red onion".
+    Falls back to all words if every word is filler ("cloves").
+    """
+    words = _words(name)
+    start, end = 0, len(words)
+    while start < end and words[start] in FILLER_WORDS:
+        start += 1
+    while end > start and words[end - 1] in TRAILING_WORDS:
+        end -= 1
+    return _singular_phrase(words[start:end] or words)
+
+
+def one_edit_apart(a: str, b: str) -> bool:
+    """Whether one substitution, insertion, deletion or swap turns a into b"""
+    if abs(len(a) - len(b)) > 1 or a == b:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    if len(a) < len(b):
+        return a[i:] == b[i + 1 :]
+    swapped = i + 1 < len(a) and a[i] == b[i + 1] and a[i + 1] == b[i]
+    return a[i + 1 :] == b[i + 1 :] or (swapped and a[i + 2 :] == b[i + 2 :])
+
+
+def trigrams(text: str):
+    padded = f"  {text} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientCanonicalizer:
+    """Maps free-text ingredient names onto a fixed vocabulary.
+
+    The whole name is looked up in the aliases and the vocabulary first, then
+    without each further leading filler word ("2 cans of chopped") and with
+    trailing filler words removed, so filler inside a name ("half and half")
+    is never dropped. Otherwise it is normalized (case, counts, packaging,
+    plurals) and resolved through the aliases. A name that then isn't in the
+    vocabulary is matched fuzzily through a trigram index: the vocabulary
+    entry sharing the most trigrams wins if its Dice similarity is at least
+    `min_similarity` ("brocoli" -> "broccoli"), or else the only candidate
+    one typo away ("chikcen" -> "chicken", from five letters on). Anything
+    else is kept in its normalized form. Results are memoized, repeated
+    names cost a dict lookup.
+    """
+
+    def __init__(
+        self,
+        vocabulary: Iterable[str] = (),
+        aliases=ALIASES,
+        min_similarity: float = 0.75,
+        cache_size: int = 100_000,
+    ):
+        self.vocabulary = {_phrase(name) for name in vocabulary} - {""}
+        self.aliases = {
+            _phrase(alias): _phrase(name) for alias, name in aliases.items()
+        }
+        self.min_similarity = min_similarity
+
+        self._terms = sorted(self.vocabulary)
+        self._trigram_counts = [len(trigrams(term)) for term in self._terms]
+        self._index = defaultdict(list)
+        for term_id, term in enumerate(self._terms):
+            for trigram in trigrams(term):
+                self._index[trigram].append(term_id)
+
+        self.canonicalize = lru_cache(maxsize=cache_size)(self._canonicalize)
+
+    @classmethod
+    def from_file(cls, path=VOCABULARY_PATH, **kwargs):
+        """Vocabulary with one ingredient per line, # starts a comment"""
+        with open(path) as f:
+            vocabulary = [line.split("#")[0].strip() for line in f]
+        return cls([name for name in vocabulary if name], **kwargs)
+
+    def fuzzy_match(self, term: str) -> Optional[str]:
+        """The most similar vocabulary entry, if it is similar enough"""
+        grams = trigrams(term)
+        shared = defaultdict(int)
+        for trigram in grams:
+            for term_id in self._index.get(trigram, ()):
+                shared[term_id] += 1
+        if not shared:
+            return None
+
+        term_id, count = max(shared.items(), key=lambda item: (item[1], -item[0]))
+        similarity = 2 * count / (len(grams) + self._trigram_counts[term_id])
+        if similarity >= self.min_similarity:
+            return self._terms[term_id]
+        if len(term) < 5:
+            return None
+
+        # Short words have few trigrams, one typo can cost half of them
+        close = [
+            self._terms[term_id]
+            for term_id, count in shared.items()
+            if count >= len(grams) // 3
+            and one_edit_apart(term, self._terms[term_id])
+        ]
+        return close[0] if len(close) == 1 else None
+
+    def _known(self, words) -> Optional[str]:
+        """The alias or vocabulary entry `words` spell, least stripped first"""
+        for start in range(len(words)):
+            for end in range(len(words), start, -1):
+                phrase = _singular_phrase(words[start:end])
+                if phrase in self.aliases:
+                    return self.aliases[phrase]
+                if phrase in self.vocabulary:
+                    return phrase
+                if words[end - 1] not in FILLER_WORDS:
+                    break
+            if words[start] not in FILLER_WORDS:
+                break
+        return None
+
+    def _canonicalize(self, name: str) -> str:
+        known = self._known(_words(name))
+        if known is not None:
+            return known
+        term = normalize_ingredient(name)
+        term = self.aliases.get(term, term)
+        if not term or term in self.vocabulary:
+            return term
+        match = self.fuzzy_match(term)
+        if match is None:
+            return term
+        return self.aliases.get(match, match)
+
+    def dedupe(self, names: Iterable[str]) -> List[str]:
+        """Canonical names in first-seen order, without duplicates or blanks"""
+        return [
+            name
+            for name in dict.fromkeys(self.canonicalize(name) for name in names)
+            if name
+        ]
+
+    def canonicalize_json(self, ingredients_json: str) -> str:
+        """Deduplicated version of an Ingredients JSON document"""
+        ingredients = Ingredients.model_validate_json(ingredients_json)
+        return Ingredients(names=self.dedupe(ingredients.names)).model_dump_json()
+
+    def canonicalize_patch(self, patch: IngredientsPatch) -> IngredientsPatch:
+        """Patch in canonical names.
+
+        Removals and renames also keep the original spelling, so items stored
+        before canonicalization existed still match.
+        """
+        return IngredientsPatch(
+            add=self.dedupe(patch.add),
+            remove=list(dict.fromkeys(patch.remove + self.dedupe(patch.remove))),
+            rename=[
+                Rename(old=old, new=self.canonicalize(rename.new))
+                for rename in patch.rename
+                for old in dict.fromkeys([rename.old, self.canonicalize(rename.old)])
+            ],
+        )
+
+
+# Shared by every MemoryManager in the process
+shared_canonicalizer = IngredientCanonicalizer.from_file()
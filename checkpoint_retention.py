@@ -0,0 +1,320 @@
+import argparse
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import psycopg
+from langgraph.checkpoint.postgres import PostgresSaver
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from psycopg.rows import dict_row
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_TABLES = ("checkpoints", "checkpoint_blobs", "checkpoint_writes")
+
+# Only the latest checkpoint of a thread is needed to continue a conversation.
+# Older ones are pruned with their pending writes and the channel blobs that
+# no remaining checkpoint references.
+
+# Threads in one compaction batch, ordered so batches can resume by thread_id
+SELECT_THREADS_SQL = """
+    SELECT thread_id FROM checkpoints
+    WHERE thread_id > %(after)s
+    GROUP BY thread_id
+    ORDER BY thread_id
+    LIMIT %(limit)s
+"""
+
+# Checkpoint ids are time-ordered UUIDs, the newest sort last
+PRUNE_CHECKPOINTS_SQL = """
+    WITH ranked AS (
+        SELECT thread_id, checkpoint_ns, checkpoint_id,
+               row_number() OVER (
+                   PARTITION BY thread_id, checkpoint_ns
+                   ORDER BY checkpoint_id DESC
+               ) AS rank
+        FROM checkpoints
+        WHERE thread_id = ANY(%(threads)s)
+    ),
+    pruned AS (
+        DELETE FROM checkpoints c
+        USING ranked r
+        WHERE c.thread_id = r.thread_id
+          AND c.checkpoint_ns = r.checkpoint_ns
+          AND c.checkpoint_id = r.checkpoint_id
+          AND r.rank > %(keep_last)s
+        RETURNING c.thread_id, c.checkpoint_ns, c.checkpoint_id
+    ),
+    writes AS (
+        DELETE FROM checkpoint_writes w
+        USING pruned p
+        WHERE w.thread_id = p.thread_id
+          AND w.checkpoint_ns = p.checkpoint_ns
+          AND w.checkpoint_id = p.checkpoint_id
+        RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM pruned) AS checkpoints,
+           (SELECT count(*) FROM writes) AS writes
+"""
+
+# A separate statement, so it sees the checkpoints PRUNE_CHECKPOINTS_SQL
+# deleted. Only blob versions older than the newest referenced one of their
+# channel are deleted: a concurrent `put` writes its blobs before the
+# checkpoint that references them, and those must survive.
+PRUNE_BLOBS_SQL = """
+    WITH live AS (
+        SELECT c.thread_id, c.checkpoint_ns, v.key AS channel, v.value AS version
+        FROM checkpoints c,
+             jsonb_each_text(c.checkpoint -> 'channel_versions') AS v
+        WHERE c.thread_id = ANY(%(threads)s)
+    ),
+    newest AS (
+        SELECT thread_id, checkpoint_ns, channel, max(version) AS version
+        FROM live
+        GROUP BY thread_id, checkpoint_ns, channel
+    ),
+    pruned AS (
+        DELETE FROM checkpoint_blobs b
+        USING newest n
+        WHERE b.thread_id = n.thread_id
+          AND b.checkpoint_ns = n.checkpoint_ns
+          AND b.channel = n.channel
+          AND b.version < n.version
+          AND NOT EXISTS (
+              SELECT 1 FROM live l
+              WHERE l.thread_id = b.thread_id
+                AND l.checkpoint_ns = b.checkpoint_ns
+                AND l.channel = b.channel
+                AND l.version = b.version
+          )
+        RETURNING 1
+    )
+    SELECT count(*) AS blobs FROM pruned
+"""
+
+TABLE_SIZE_SQL = """
+    SELECT pg_total_relation_size(%s::regclass) AS bytes,
+           pg_size_pretty(pg_total_relation_size(%s::regclass)) AS size
+"""
+
+
+def parse_retention(value: Optional[str]) -> Optional[int]:
+    """CHECKPOINT_RETENTION: unset or "all" keeps everything, "shallow" only
+    the latest checkpoint, a number that many per thread"""
+    if not value or value == "all":
+        return None
+    if value == "shallow":
+        return 1
+    keep_last = int(value)
+    if keep_last < 1:
+        raise ValueError("CHECKPOINT_RETENTION must keep at least one checkpoint")
+    return keep_last
+
+
+def keep_last_arg(value: str) -> int:
+    """argparse type for --keep-last, a whole number of at least one"""
+    try:
+        keep_last = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a number: {value!r}") from None
+    if keep_last < 1:
+        raise argparse.ArgumentTypeError("must keep at least one checkpoint")
+    return keep_last
+
+
+@dataclass
+class CompactionResult:
+    threads: int = 0
+    checkpoints: int = 0
+    writes: int = 0
+    blobs: int = 0
+
+    def add(self, counts):
+        self.checkpoints += counts["checkpoints"]
+        self.writes += counts["writes"]
+        self.blobs += counts["blobs"]
+
+
+def _prune_params(threads, keep_last):
+    # keep_last=0 would delete every checkpoint of the threads
+    if keep_last < 1:
+        raise ValueError("must keep at least one checkpoint per thread")
+    return {"threads": list(threads), "keep_last": keep_last}
+
+
+def prune_threads(cur, threads, keep_last: int):
+    """Keep the newest `keep_last` checkpoints of each thread, returns counts"""
+    params = _prune_params(threads, keep_last)
+    cur.execute(PRUNE_CHECKPOINTS_SQL, params)
+    counts = dict(cur.fetchone())
+    cur.execute(PRUNE_BLOBS_SQL, params)
+    counts.update(cur.fetchone())
+    return counts
+
+
+async def aprune_threads(cur, threads, keep_last: int):
+    params = _prune_params(threads, keep_last)
+    await cur.execute(PRUNE_CHECKPOINTS_SQL, params)
+    counts = dict(await cur.fetchone())
+    await cur.execute(PRUNE_BLOBS_SQL, params)
+    counts.update(await cur.fetchone())
+    return counts
+
+
+def _should_prune(metadata, prune_every):
+    return metadata.get("step", 0) % prune_every == 0
+
+
+class RetainingPostgresSaver(PostgresSaver):
+    """PostgresSaver that keeps only the newest `keep_last` checkpoints.
+
+    A thread is pruned every `prune_every` steps, so it holds at most
+    `keep_last + prune_every` checkpoints and pruning stays off most writes.
+    `keep_last=1` is the latest-only (shallow) mode.
+    """
+
+    def __init__(self, conn, keep_last: int, prune_every: int = 10, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.keep_last = keep_last
+        self.prune_every = prune_every
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        if _should_prune(metadata, self.prune_every):
+            thread_id = config["configurable"]["thread_id"]
+            with self._cursor() as cur:
+                prune_threads(cur, [thread_id], self.keep_last)
+        return next_config
+
+
+class AsyncRetainingPostgresSaver(AsyncPostgresSaver):
+    """Async counterpart of RetainingPostgresSaver"""
+
+    def __init__(self, conn, keep_last: int, prune_every: int = 10, **kwargs):
+        super().__init__(conn, **kwargs)
+        self.keep_last = keep_last
+        self.prune_every = prune_every
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        if _should_prune(metadata, self.prune_every):
+            thread_id = config["configurable"]["thread_id"]
+            async with self._cursor() as cur:
+                await aprune_threads(cur, [thread_id], self.keep_last)
+        return next_config
+
+
+def postgres_saver(pool, keep_last: Optional[int]):
+    if keep_last is None:
+        return PostgresSaver(conn=pool)
+    return RetainingPostgresSaver(pool, keep_last=keep_last)
+
+
+def async_postgres_saver(pool, keep_last: Optional[int]):
+    if keep_last is None:
+        return AsyncPostgresSaver(conn=pool)
+    return AsyncRetainingPostgresSaver(pool, keep_last=keep_last)
+
+
+def compact(conn, keep_last: int, batch_size: int = 100) -> CompactionResult:
+    """Prune every thread to its newest `keep_last` checkpoints.
+
+    Runs one transaction per batch of `batch_size` threads, so locks are
+    short and an interrupted compaction keeps the batches already done.
+    """
+    result = CompactionResult()
+    after = ""
+    with conn.cursor(row_factory=dict_row) as cur:
+        while True:
+            cur.execute(SELECT_THREADS_SQL, {"after": after, "limit": batch_size})
+            threads = [row["thread_id"] for row in cur.fetchall()]
+            if not threads:
+                return result
+
+            with conn.transaction():
+                result.add(prune_threads(cur, threads, keep_last))
+            result.threads += len(threads)
+            after = threads[-1]
+            logger.info("compacted %d threads up to %r", result.threads, after)
+
+
+def table_sizes(conn):
+    """Rows and total size (with indexes and TOAST) of the checkpoint tables"""
+    sizes = []
+    with conn.cursor(row_factory=dict_row) as cur:
+        for table in CHECKPOINT_TABLES:
+            cur.execute(TABLE_SIZE_SQL, (table, table))
+            size = cur.fetchone()
+            cur.execute(f"SELECT count(*) AS rows FROM {table}")
+            sizes.append({"table": table, **size, **cur.fetchone()})
+    return sizes
+
+
+def vacuum(conn, full: bool = False):
+    """Make the space of deleted rows reusable; `full` returns it to the OS
+    but locks each table while it is rewritten"""
+    for table in CHECKPOINT_TABLES:
+        conn.execute(f"VACUUM ({'FULL, ' if full else ''}ANALYZE) {table}")
+
+
+def print_sizes(conn, label):
+    print(label)
+    for row in table_sizes(conn):
+        print(f"  {row['table']:<20} {row['rows']:>10} rows {row['size']:>10}")
+
+
+def build_parser(retention: Optional[int]) -> argparse.ArgumentParser:
+    """The CLI, `retention` is the parsed CHECKPOINT_RETENTION"""
+    parser = argparse.ArgumentParser(
+        description="Prune old LangGraph checkpoints or report their table sizes"
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    compact_parser = commands.add_parser("compact", help="prune old checkpoints")
+    # No fallback, pruning every thread to its latest checkpoint by accident
+    # can't be undone
+    compact_parser.add_argument(
+        "--keep-last",
+        type=keep_last_arg,
+        default=retention,
+        required=retention is None,
+        help="checkpoints to keep per thread, default: CHECKPOINT_RETENTION",
+    )
+    compact_parser.add_argument("--batch-size", type=int, default=100)
+    compact_parser.add_argument(
+        "--vacuum-full",
+        action="store_true",
+        help="rewrite the tables to return the freed space to the OS",
+    )
+    commands.add_parser("sizes", help="report the checkpoint table sizes")
+    return parser
+
+
+def main():
+    # Not at the top, memory imports this module
+    from memory import DB_URI
+
+    retention = parse_retention(os.getenv("CHECKPOINT_RETENTION"))
+    args = build_parser(retention).parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with psycopg.connect(DB_URI, autocommit=True) as conn:
+        if args.command == "sizes":
+            print_sizes(conn, "checkpoint tables")
+            return
+
+        print_sizes(conn, "before")
+        start = time.perf_counter()
+        result = compact(conn, args.keep_last, args.batch_size)
+        vacuum(conn, full=args.vacuum_full)
+        print(
+            f"pruned {result.checkpoints} checkpoints, {result.writes} writes and "
+            f"{result.blobs} blobs in {result.threads} threads "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        print_sizes(conn, "after")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import hashlib
+import json
+import re
+import threading
+from typing import Optional, Type
+
+from pydantic import BaseModel
+
+from memory_cache import MemoryCache
+
+LOAD_EXTRACTION_SQL = """
+    SELECT result FROM extraction_cache WHERE key = %s AND expires_at > NOW()
+"""
+
+SAVE_EXTRACTION_SQL = """
+    INSERT INTO extraction_cache (key, schema_name, result, expires_at)
+    VALUES (%s, %s, %s, NOW() + make_interval(secs => %s))
+    ON CONFLICT (key) DO UPDATE
+    SET result = EXCLUDED.result, expires_at = EXCLUDED.expires_at
+"""
+
+EVICT_EXTRACTIONS_SQL = """
+    DELETE FROM extraction_cache WHERE expires_at <= NOW()
+"""
+
+# The extraction contexts end with the current time down to microseconds,
+# which would make every key unique. Keys keep only the date.
+SYSTEM_TIME = re.compile(r"(System Time: \d{4}-\d{2}-\d{2})T[\d:.]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_message(message):
+    """The parts of a message that influence the model's answer"""
+    content = message.content
+    if not isinstance(content, str):
+        content = json.dumps(content, sort_keys=True)
+    content = WHITESPACE.sub(" ", SYSTEM_TIME.sub(r"\1", content)).strip()
+
+    normalized = {"type": message.type, "content": content}
+    # Tool call ids are random per turn and don't change the answer
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [
+            {"name": call["name"], "args": call["args"]} for call in tool_calls
+        ]
+    return normalized
+
+
+def extraction_cache_key(model_name: str, schema: Type[BaseModel], messages):
+    """Stable hash of everything an extraction result depends on"""
+    payload = {
+        "model": model_name,
+        "schema": schema.model_json_schema(),
+        "messages": [normalize_message(message) for message in messages],
+    }
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class ExtractionCache:
+    """Exact-match cache of structured extraction results.
+
+    Lookups go to an in-process LRU first, then, if a connection pool is
+    given, to the `extraction_cache` table, whose hits are copied into the
+    LRU. Both tiers expire entries after `ttl` seconds; expired rows are
+    deleted every `evict_every` writes or by `evict_expired`.
+    """
+
+    def __init__(
+        self,
+        pool=None,
+        max_entries: int = 1000,
+        ttl: float = 24 * 3600,
+        evict_every: int = 100,
+    ):
+        self.pool = pool
+        self.ttl = ttl
+        self.evict_every = evict_every
+        self.local = MemoryCache(max_entries=max_entries, ttl=ttl)
+
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    def wrap(self, llm, schema: Type[BaseModel], model_name: str):
+        return CachedExtraction(llm, self, schema, model_name)
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            return getattr(self, counter)
+
+    def _local_get(self, key):
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count("local_hits")
+            return entry.value
+        return None
+
+    def _found(self, key, row):
+        if row is None:
+            self._count("misses")
+            return None
+        self._count("db_hits")
+        result = json.dumps(row["result"])
+        self.local.put(key, result, 0)
+        return result
+
+    def _written(self):
+        """Whether this write should also evict expired rows"""
+        return self._count("writes") % self.evict_every == 0
+
+    def get(self, key) -> Optional[str]:
+        """The cached result JSON for key, None on a miss"""
+        result = self._local_get(key)
+        if result is not None or self.pool is None:
+            if result is None:
+                self._count("misses")
+            return result
+
+        with self.pool.connection() as conn:
+            row = conn.execute(LOAD_EXTRACTION_SQL, (key,)).fetchone()
+        return self._found(key, row)
+
+    async def aget(self, key) -> Optional[str]:
+        """Async version of `get`, for an AsyncConnectionPool"""
+        result = self._local_get(key)
+        if result is not None or self.pool is None:
+            if result is None:
+                self._count("misses")
+            return result
+
+        async with self.pool.connection() as conn:
+            cur = await conn.execute(LOAD_EXTRACTION_SQL, (key,))
+            row = await cur.fetchone()
+        return self._found(key, row)
+
+    def put(self, key, schema_name: str, result: str):
+        self.local.put(key, result, 0)
+        if self.pool is None:
+            return
+
+        evict = self._written()
+        with self.pool.connection() as conn:
+            conn.execute(SAVE_EXTRACTION_SQL, (key, schema_name, result, self.ttl))
+            if evict:
+                conn.execute(EVICT_EXTRACTIONS_SQL)
+
+    async def aput(self, key, schema_name: str, result: str):
+        self.local.put(key, result, 0)
+        if self.pool is None:
+            return
+
+        evict = self._written()
+        async with self.pool.connection() as conn:
+            await conn.execute(
+                SAVE_EXTRACTION_SQL, (key, schema_name, result, self.ttl)
+            )
+            if evict:
+                await conn.execute(EVICT_EXTRACTIONS_SQL)
+
+    def evict_expired(self):
+        """Delete expired rows, returns how many"""
+        if self.pool is None:
+            return 0
+
+        with self.pool.connection() as conn:
+            return conn.execute(EVICT_EXTRACTIONS_SQL).rowcount
+
+    async def aevict_expired(self):
+        if self.pool is None:
+            return 0
+
+        async with self.pool.connection() as conn:
+            return (await conn.execute(EVICT_EXTRACTIONS_SQL)).rowcount
+
+    def stats(self):
+        with self._lock:
+            lookups = self.local_hits + self.db_hits + self.misses
+            hits = self.local_hits + self.db_hits
+            return {
+                "lookups": lookups,
+                "local_hits": self.local_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "entries": self.local.stats()["entries"],
+            }
+
+
+class CachedExtraction:
+    """A structured-output runnable that skips the model on cache hits"""
+
+    def __init__(self, llm, cache: ExtractionCache, schema, model_name: str):
+        self.llm = llm
+        self.cache = cache
+        self.schema = schema
+        self.model_name = model_name
+
+    def _key(self, messages):
+        return extraction_cache_key(self.model_name, self.schema, messages)
+
+    def invoke(self, messages, config=None):
+        key = self._key(messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return self.schema.model_validate_json(cached)
+
+        result = self.llm.invoke(messages, config)
+        if result is not None:
+            self.cache.put(key, self.schema.__name__, result.model_dump_json())
+        return result
+
+    async def ainvoke(self, messages, config=None):
+        key = self._key(messages)
+        cached = await self.cache.aget(key)
+        if cached is not None:
+            return self.schema.model_validate_json(cached)
+
+        result = await self.llm.ainvoke(messages, config)
+        if result is not None:
+            await self.cache.aput(key, self.schema.__name__, result.model_dump_json())
+        return result
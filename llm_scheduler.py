@@ -0,0 +1,291 @@
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import List, Optional
+
+import httpx
+
+# ChatOpenAI clients of a scheduled model point here, the transport rewrites
+# the URL to the backend the scheduler picked
+SCHEDULER_BASE_URL = "http://llm-scheduler/v1"
+
+
+class Priority(IntEnum):
+    """Lower values are served first"""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+_priority = contextvars.ContextVar("llm_priority", default=Priority.INTERACTIVE)
+
+
+@contextlib.contextmanager
+def llm_priority(priority: Priority):
+    """Run the LLM calls made inside the block with the given priority"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@dataclass
+class Backend:
+    url: str
+    max_in_flight: int
+    in_flight: int = 0
+    served: int = 0
+
+    @property
+    def load(self):
+        return self.in_flight / self.max_in_flight
+
+
+class _Waiter:
+    def __init__(self):
+        self.backend = None
+        self.enqueued_at = time.monotonic()
+        self._event = threading.Event()
+        self._loop = None
+        self._future = None
+
+    @classmethod
+    def for_loop(cls, loop):
+        waiter = cls()
+        waiter._loop = loop
+        waiter._future = loop.create_future()
+        return waiter
+
+    def wait(self):
+        self._event.wait()
+        return self.backend
+
+    def grant(self, backend):
+        self.backend = backend
+        if self._future is None:
+            self._event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self._future.done():
+            self._future.set_result(self.backend)
+
+
+class LLMScheduler:
+    """Limits and orders requests to one or more OpenAI-compatible backends.
+
+    Each backend serves at most `max_in_flight` requests at a time. Waiting
+    requests are served by priority, then in arrival order, on the least
+    loaded backend with a free slot. Works from threads and event loops alike.
+    """
+
+    def __init__(self, backend_urls: List[str], max_in_flight: int = 2):
+        if not backend_urls:
+            raise ValueError("LLMScheduler needs at least one backend URL")
+
+        self.backends = [
+            Backend(url.rstrip("/"), max_in_flight) for url in backend_urls
+        ]
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._order = itertools.count()
+
+        self._queue_time = {priority: [0, 0.0, 0.0] for priority in Priority}
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, called with the lock held"""
+        while self._waiting:
+            free = [b for b in self.backends if b.in_flight < b.max_in_flight]
+            if not free:
+                return
+
+            priority, _, waiter = heapq.heappop(self._waiting)
+            backend = min(free, key=lambda b: b.load)
+            backend.in_flight += 1
+            backend.served += 1
+
+            waited = time.monotonic() - waiter.enqueued_at
+            stats = self._queue_time[priority]
+            stats[0] += 1
+            stats[1] += waited
+            stats[2] = max(stats[2], waited)
+
+            waiter.grant(backend)
+
+    def _enqueue(self, waiter, priority):
+        with self._lock:
+            heapq.heappush(self._waiting, (priority, next(self._order), waiter))
+            self._dispatch()
+
+    def acquire(self, priority: Optional[Priority] = None) -> Backend:
+        """Block until a backend slot is free"""
+        waiter = _Waiter()
+        self._enqueue(waiter, _priority.get() if priority is None else priority)
+        return waiter.wait()
+
+    async def aacquire(self, priority: Optional[Priority] = None) -> Backend:
+        """Wait until a backend slot is free without blocking the event loop"""
+        waiter = _Waiter.for_loop(asyncio.get_running_loop())
+        self._enqueue(waiter, _priority.get() if priority is None else priority)
+        try:
+            return await waiter._future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.backend is None:
+                    self._waiting = [w for w in self._waiting if w[2] is not waiter]
+                    heapq.heapify(self._waiting)
+                    raise
+            self.release(waiter.backend)
+            raise
+
+    def release(self, backend: Backend):
+        with self._lock:
+            backend.in_flight -= 1
+            self._dispatch()
+
+    def stats(self):
+        """Queue depth, queue time per priority and load per backend"""
+        with self._lock:
+            depth = {priority.name.lower(): 0 for priority in Priority}
+            for priority, _, _ in self._waiting:
+                depth[Priority(priority).name.lower()] += 1
+
+            queue_time = {}
+            for priority, (count, total, longest) in self._queue_time.items():
+                queue_time[priority.name.lower()] = {
+                    "requests": count,
+                    "avg_seconds": total / count if count else 0.0,
+                    "max_seconds": longest,
+                }
+
+            return {
+                "queue_depth": depth,
+                "queue_time": queue_time,
+                "backends": [
+                    {"url": b.url, "in_flight": b.in_flight, "served": b.served}
+                    for b in self.backends
+                ],
+            }
+
+
+def _backend_request(request: httpx.Request, backend: Backend):
+    """Point a request for SCHEDULER_BASE_URL at the backend"""
+    path = str(request.url)[len(SCHEDULER_BASE_URL) :]
+    request.url = httpx.URL(backend.url + path)
+    request.headers["host"] = request.url.netloc.decode()
+    return request
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees the backend slot once it is consumed"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _Release:
+    """Releases a slot exactly once"""
+
+    def __init__(self, scheduler, backend):
+        self._scheduler = scheduler
+        self._backend = backend
+        self._done = False
+
+    def __call__(self):
+        if not self._done:
+            self._done = True
+            self._scheduler.release(self._backend)
+
+
+class SchedulingTransport(httpx.BaseTransport):
+    """httpx transport that sends every request through an LLMScheduler.
+
+    The slot is held until the response body is closed, so streamed
+    completions count as in flight until the last token.
+    """
+
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+        self._transport = httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        backend = self.scheduler.acquire()
+        release = _Release(self.scheduler, backend)
+        try:
+            response = self._transport.handle_request(
+                _backend_request(request, backend)
+            )
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncSchedulingTransport(httpx.AsyncBaseTransport):
+    """Async version of `SchedulingTransport`"""
+
+    def __init__(self, scheduler: LLMScheduler):
+        self.scheduler = scheduler
+        self._transport = httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        backend = await self.scheduler.aacquire()
+        release = _Release(self.scheduler, backend)
+        try:
+            response = await self._transport.handle_async_request(
+                _backend_request(request, backend)
+            )
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
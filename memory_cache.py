@@ -0,0 +1,132 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "ingrai_memory"
+
+
+@dataclass
+class CacheEntry:
+    value: Any
+    version: int
+    expires_at: float
+
+
+class MemoryCache:
+    """Process-wide LRU/TTL cache of parsed Preferences and Ingredients.
+
+    Entries are keyed by (kind, user_id) and carry the row version from the
+    database. Writes from other processes bump the version and are announced
+    with NOTIFY on `NOTIFY_CHANNEL`; `start_listener` evicts stale entries on
+    those notifications. The TTL bounds staleness when no listener is running.
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[tuple, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener: Optional[threading.Thread] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key) -> Optional[CacheEntry]:
+        """Return the live entry for key, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, value, version: int):
+        """Cache value unless a newer version is already cached"""
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and current.version > version:
+                return
+
+            self._entries[key] = CacheEntry(
+                value=value, version=version, expires_at=time.monotonic() + self.ttl
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key, version: Optional[int] = None):
+        """Drop key, or only if the cached entry is older than version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            if version is None or entry.version < version:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def start_listener(self, db_uri: str, retry_delay: float = 5.0):
+        """Invalidate entries on NOTIFYs from other processes, once per cache"""
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._listener = threading.Thread(
+                target=self._listen,
+                args=(db_uri, retry_delay),
+                name="memory-cache-listener",
+                daemon=True,
+            )
+        self._listener.start()
+
+    def _listen(self, db_uri, retry_delay):
+        while True:
+            try:
+                with psycopg.connect(db_uri, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {NOTIFY_CHANNEL}")
+                    # Anything cached before LISTEN may have missed a change
+                    self.clear()
+                    for notify in conn.notifies():
+                        payload = json.loads(notify.payload)
+                        self.invalidate(
+                            (payload["kind"], payload["user_id"]), payload["version"]
+                        )
+            except Exception:
+                logger.exception("Memory cache listener failed, reconnecting")
+                self.clear()
+                time.sleep(retry_delay)
+
+
+# Shared by every MemoryManager in the process
+shared_cache = MemoryCache()
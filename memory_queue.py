@@ -0,0 +1,217 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MemoryUpdateJob:
+    """A pending memory extraction for one user and memory type"""
+
+    user_id: str
+    update_type: str
+    messages: list
+    enqueued_at: float = field(default_factory=time.monotonic)
+    attempts: int = 0
+    not_before: float = 0.0
+    # Version of the job's outbox row, None without an outbox
+    version: Optional[int] = None
+
+    @property
+    def key(self):
+        return (self.user_id, self.update_type)
+
+
+class MemoryUpdateQueue:
+    """Background worker queue for memory extraction (write-behind).
+
+    Jobs are coalesced per (user_id, update_type): a newer conversation
+    snapshot replaces a pending one, since extraction always starts from the
+    stored memory plus the full history. At most one job per key is in flight,
+    and a failed job is retried until it succeeds or `max_attempts` is hit.
+
+    With an `outbox` (the MemoryManager) delivery is at least once: `submit`
+    stores the job in the memory_update_jobs table before it returns, and
+    the row is only deleted after the handler succeeded. Jobs still there
+    after a crash, a shutdown that timed out or running out of attempts are
+    replayed when the next queue starts. Without an outbox jobs only live in
+    process memory and are lost in those cases.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[MemoryUpdateJob], None],
+        workers: int = 1,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+        outbox=None,
+    ):
+        self._handler = handler
+        self._outbox = outbox
+        self._max_attempts = max_attempts
+        self._retry_delay = retry_delay
+
+        self._pending: "OrderedDict[tuple, MemoryUpdateJob]" = OrderedDict()
+        self._in_flight: dict = {}
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.processed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.replayed = 0
+
+        if outbox is not None:
+            for row in outbox.load_memory_jobs():
+                job = MemoryUpdateJob(**row)
+                self._pending[job.key] = job
+                self.replayed += 1
+
+        self._threads = [
+            threading.Thread(
+                target=self._worker, name=f"memory-update-{i}", daemon=True
+            )
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, user_id, update_type, messages):
+        """Queue a memory extraction, replacing any pending one for the same key"""
+        job = MemoryUpdateJob(
+            user_id=user_id, update_type=update_type, messages=messages
+        )
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MemoryUpdateQueue is shut down")
+        if self._outbox is not None:
+            job.version = self._outbox.save_memory_job(
+                user_id, update_type, messages
+            )
+        with self._cond:
+            previous = self._pending.get(job.key)
+            if previous is not None and (previous.version or 0) > (job.version or 0):
+                # A concurrent submit stored a newer snapshot first
+                return
+            self._pending.pop(job.key, None)
+            if previous is not None:
+                # Keep the original enqueue time so lag reflects the oldest
+                # unprocessed change
+                job.enqueued_at = previous.enqueued_at
+                self.coalesced += 1
+            self._pending[job.key] = job
+            self._cond.notify()
+
+    def _next_job(self) -> Optional[MemoryUpdateJob]:
+        """Pop the oldest runnable job, waiting until one is available"""
+        with self._cond:
+            while True:
+                if self._closed and not self._pending:
+                    return None
+
+                now = time.monotonic()
+                wait = None
+                for key, job in self._pending.items():
+                    if key in self._in_flight:
+                        continue
+                    if job.not_before > now:
+                        delay = job.not_before - now
+                        wait = delay if wait is None else min(wait, delay)
+                        continue
+                    del self._pending[key]
+                    self._in_flight[key] = job
+                    return job
+
+                self._cond.wait(timeout=wait)
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+
+            job.attempts += 1
+            try:
+                self._handler(job)
+            except Exception:
+                logger.exception(
+                    "Memory update %s for %s failed (attempt %d)",
+                    job.update_type,
+                    job.user_id,
+                    job.attempts,
+                )
+                self._retry(job)
+            else:
+                self._delete(job)
+                with self._cond:
+                    self.processed += 1
+            finally:
+                with self._cond:
+                    self._in_flight.pop(job.key, None)
+                    self._cond.notify_all()
+
+    def _delete(self, job: MemoryUpdateJob):
+        if self._outbox is None:
+            return
+        try:
+            self._outbox.delete_memory_job(job.user_id, job.update_type, job.version)
+        except Exception:
+            # Replayed by the next queue, at least once allows that
+            logger.exception(
+                "Could not delete memory update %s for %s from the outbox",
+                job.update_type,
+                job.user_id,
+            )
+
+    def _retry(self, job: MemoryUpdateJob):
+        with self._cond:
+            if job.key in self._pending:
+                # A newer snapshot is already waiting and supersedes this one
+                return
+            if job.attempts >= self._max_attempts:
+                # Stays in the outbox, if any, until the next queue starts
+                self.failed += 1
+                return
+            job.not_before = time.monotonic() + self._retry_delay * job.attempts
+            self._pending[job.key] = job
+            self.retried += 1
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued jobs are processed, returns False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._pending or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=remaining)
+            return True
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop accepting jobs and let the workers drain the queue"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def stats(self):
+        """Queue depth, lag of the oldest pending change and counters"""
+        with self._cond:
+            jobs = list(self._pending.values()) + list(self._in_flight.values())
+            oldest = min((job.enqueued_at for job in jobs), default=None)
+            return {
+                "depth": len(self._pending),
+                "in_flight": len(self._in_flight),
+                "lag_seconds": 0.0 if oldest is None else time.monotonic() - oldest,
+                "processed": self.processed,
+                "failed": self.failed,
+                "coalesced": self.coalesced,
+                "retried": self.retried,
+                "replayed": self.replayed,
+            }
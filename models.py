@@ -1,4 +1,4 @@
-from typing import Literal, TypedDict
+from typing import Annotated, Literal, Optional, TypedDict
 
 from pydantic import BaseModel, Field
 
@@ -26,7 +26,96 @@ class Ingredients(BaseModel):
     )
 
 
+class PantryItem(BaseModel):
+    """One item of a bulk pantry import"""
+
+    user_id: str
+    name: str
+    quantity: Optional[str] = None
+
+
 class UpdateMemory(TypedDict):
     """Decision on what memory type to update"""
 
     update_type: Literal["preferences", "ingredients"]
+
+
+class FindRecipes(TypedDict):
+    """Find recipes in the recipe collection that the user can cook with the
+    ingredients they have, respecting their dislikes and dietary restrictions"""
+
+    max_missing: Annotated[
+        int, ..., "How many ingredients may be missing, 0 for what they can cook now"
+    ]
+    must_use: Annotated[
+        list[str], ..., "Ingredients the recipes must contain, may be empty"
+    ]
+
+
+class Rename(BaseModel):
+    """Rename of a single list item"""
+
+    old: str = Field(description="The item as currently stored")
+    new: str = Field(description="The new name for the item")
+
+
+class ListPatch(BaseModel):
+    """Changes to a list of items"""
+
+    add: list[str] = Field(description="Items to add", default_factory=list)
+    remove: list[str] = Field(description="Items to remove", default_factory=list)
+    rename: list[Rename] = Field(description="Items to rename", default_factory=list)
+
+    def is_empty(self):
+        return not (self.add or self.remove or self.rename)
+
+
+class PreferencesPatch(BaseModel):
+    """Changes to the user's food preferences and restrictions"""
+
+    likes: ListPatch = Field(
+        description="Changes to foods the user likes", default_factory=ListPatch
+    )
+    dislikes: ListPatch = Field(
+        description="Changes to foods the user doesn't like", default_factory=ListPatch
+    )
+    dietary_restrictions: ListPatch = Field(
+        description="Changes to dietary restrictions", default_factory=ListPatch
+    )
+    cooking_goals: ListPatch = Field(
+        description="Changes to food or cooking related goals",
+        default_factory=ListPatch,
+    )
+
+    def is_empty(self):
+        return all(
+            getattr(self, field).is_empty() for field in Preferences.model_fields
+        )
+
+
+class IngredientsPatch(ListPatch):
+    """Changes to the ingredients the user has at home"""
+
+
+class MemoryUpdate(BaseModel):
+    """Updated user preferences and ingredients"""
+
+    preferences: Preferences = Field(
+        description="The user's preferences", default_factory=Preferences
+    )
+    ingredients: Ingredients = Field(
+        description="All ingredients the user has", default_factory=Ingredients
+    )
+
+
+class MemoryPatch(BaseModel):
+    """Changes to the user's preferences and ingredients"""
+
+    preferences: PreferencesPatch = Field(
+        description="Changes to the user's preferences",
+        default_factory=PreferencesPatch,
+    )
+    ingredients: IngredientsPatch = Field(
+        description="Changes to the ingredients the user has",
+        default_factory=IngredientsPatch,
+    )
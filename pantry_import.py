@@ -0,0 +1,226 @@
+import argparse
+import csv
+import io
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from canonicalize import IngredientCanonicalizer, shared_canonicalizer
+from memory import MemoryManager
+from models import PantryItem
+
+FORMATS = ("csv", "json", "text", "receipt")
+
+# "2 onions", "500g flour", "3 x eggs", and "eggs x12"
+LEADING_QUANTITY = re.compile(
+    r"^(\d+(?:[.,/]\d+)?(?:\s*(?:kg|g|mg|ml|cl|dl|l|lbs?|oz)\b)?)\s*(?:x\s+)?(.+)$",
+    re.IGNORECASE,
+)
+TRAILING_QUANTITY = re.compile(r"^(.+?)\s*\bx\s*(\d+)$", re.IGNORECASE)
+
+# Receipt lines: an item ends in its price, optionally followed by a tax
+# code; a count or weight may follow on its own line ("2 @ 0.99")
+RECEIPT_PRICE = re.compile(r"\s+-?[$€£]?\d+[.,]\d{2}(?:\s+[A-Z*]{1,2})?$")
+RECEIPT_MULTIPLIER = re.compile(
+    r"^(\d+(?:[.,]\d+)?(?:\s*(?:kg|lb))?)\s*(?:@|x)\s*[$€£]?\d", re.IGNORECASE
+)
+RECEIPT_ITEM_CODE = re.compile(r"^\d{4,}\s+")
+RECEIPT_SKIP = re.compile(
+    r"\b(sub-?total|total|tax|vat|change|cash|card|visa|mastercard|amex|debit|"
+    r"credit|balance|tender|savings|discount|coupon|deposit|bag fee)\b",
+    re.IGNORECASE,
+)
+
+
+def split_quantity(text: str):
+    """(name, quantity) of a free-text item, quantity None if there is none"""
+    text = text.strip()
+    match = LEADING_QUANTITY.match(text)
+    if match:
+        return match.group(2).strip(), match.group(1)
+    match = TRAILING_QUANTITY.match(text)
+    if match:
+        return match.group(1).strip(), match.group(2)
+    return text, None
+
+
+def _item(user_id, text, quantity=None):
+    if user_id is None:
+        raise ValueError(f"no user for {text!r}, pass a default user")
+    name, parsed = split_quantity(text)
+    return PantryItem(user_id=str(user_id), name=name, quantity=quantity or parsed)
+
+
+def parse_csv(data: str, user_id: Optional[str] = None) -> List[PantryItem]:
+    """Rows with a name (or ingredient, item) column and optional user_id and
+    quantity columns"""
+    rows = csv.DictReader(io.StringIO(data))
+    fields = {field.strip().lower(): field for field in rows.fieldnames or []}
+    name_field = next(
+        (fields[f] for f in ("name", "ingredient", "item") if f in fields), None
+    )
+    if name_field is None:
+        raise ValueError("CSV needs a name, ingredient or item column")
+    user_field = next((fields[f] for f in ("user_id", "user") if f in fields), None)
+    quantity_field = next(
+        (fields[f] for f in ("quantity", "qty") if f in fields), None
+    )
+
+    items = []
+    for row in rows:
+        if not (row.get(name_field) or "").strip():
+            continue
+        items.append(
+            _item(
+                (row.get(user_field) if user_field else None) or user_id,
+                row[name_field],
+                (row.get(quantity_field) if quantity_field else None) or None,
+            )
+        )
+    return items
+
+
+def _json_items(user_id, entries):
+    if not isinstance(entries, list):
+        raise ValueError(f"expected a list of items, got {entries!r}")
+    for entry in entries:
+        if isinstance(entry, str):
+            yield _item(user_id, entry)
+        elif isinstance(entry, dict) and isinstance(entry.get("name"), str):
+            quantity = entry.get("quantity")
+            yield _item(
+                entry.get("user_id", user_id),
+                entry["name"],
+                str(quantity) if quantity is not None else None,
+            )
+        else:
+            raise ValueError(
+                f"expected a name or an object with a name, got {entry!r}"
+            )
+
+
+def parse_json(data: str, user_id: Optional[str] = None) -> List[PantryItem]:
+    """A list of names or {"name", "quantity", "user_id"} objects, or an
+    object mapping user ids to such lists"""
+    document = json.loads(data)
+    if isinstance(document, dict):
+        return [
+            item
+            for user, entries in document.items()
+            for item in _json_items(user, entries)
+        ]
+    return list(_json_items(user_id, document))
+
+
+def parse_text(data: str, user_id: Optional[str] = None) -> List[PantryItem]:
+    """One item per line or comma-separated, # starts a comment"""
+    return [
+        _item(user_id, entry)
+        for line in data.splitlines()
+        for entry in line.split("#")[0].split(",")
+        if entry.strip()
+    ]
+
+
+def parse_receipt(data: str, user_id: Optional[str] = None) -> List[PantryItem]:
+    """Item lines of a till receipt's text, headers and totals are skipped"""
+    items = []
+    for line in data.splitlines():
+        line = line.strip()
+        multiplier = RECEIPT_MULTIPLIER.match(line)
+        if multiplier:
+            if items:
+                items[-1].quantity = multiplier.group(1)
+            continue
+        if not RECEIPT_PRICE.search(line) or RECEIPT_SKIP.search(line):
+            continue
+        text = RECEIPT_ITEM_CODE.sub("", RECEIPT_PRICE.sub("", line)).strip()
+        if re.search(r"[a-zA-Z]{2}", text):
+            items.append(_item(user_id, text))
+    return items
+
+
+PARSERS = {
+    "csv": parse_csv,
+    "json": parse_json,
+    "text": parse_text,
+    "receipt": parse_receipt,
+}
+
+
+def parse_items(data: str, import_format: str, user_id: Optional[str] = None):
+    """PantryItem items of a csv, json, text or receipt import. `user_id` is
+    used for items that don't name their user."""
+    if import_format not in PARSERS:
+        raise ValueError(
+            f"Unknown import format {import_format!r}, expected one of {FORMATS}"
+        )
+    return PARSERS[import_format](data, user_id)
+
+
+def known_items(items, canonicalizer: IngredientCanonicalizer):
+    """Only the items whose canonical name is in the vocabulary. Receipts
+    list household goods too, which shouldn't end up in the pantry."""
+    return [
+        item
+        for item in items
+        if canonicalizer.canonicalize(item.name) in canonicalizer.vocabulary
+    ]
+
+
+def detect_format(path: str) -> str:
+    suffix = Path(path).suffix.lower()
+    return {".csv": "csv", ".json": "json"}.get(suffix, "text")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add a grocery haul to one or many users' pantries"
+    )
+    parser.add_argument("files", nargs="+", help="files to import, - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="default: by extension")
+    parser.add_argument("--user", help="user of items that don't name one")
+    parser.add_argument(
+        "--known-only",
+        action="store_true",
+        help="skip items not in the vocabulary, the default for receipts",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="print the canonical items only"
+    )
+    args = parser.parse_args()
+
+    items = []
+    for path in args.files:
+        data = sys.stdin.read() if path == "-" else Path(path).read_text()
+        import_format = args.format or detect_format(path)
+        parsed = parse_items(data, import_format, args.user)
+        if args.known_only or import_format == "receipt":
+            parsed = known_items(parsed, shared_canonicalizer)
+        items.extend(parsed)
+
+    if args.dry_run:
+        for item in items:
+            quantity = f" ({item.quantity})" if item.quantity else ""
+            name = shared_canonicalizer.canonicalize(item.name)
+            print(f"{item.user_id}: {name}{quantity}")
+        return
+
+    memory_manager = MemoryManager()
+    try:
+        start = time.perf_counter()
+        result = memory_manager.import_pantry_items(items)
+    finally:
+        memory_manager.close()
+    print(
+        f"imported {len(items)} items for {result['users']} users in "
+        f"{time.perf_counter() - start:.2f}s: {result['inserted']} new, "
+        f"{result['updated']} already there"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import re
+
+# Phrases that signal the user is telling us about their kitchen or about
+# themselves, which are the two things the UpdateMemory tool records
+MEMORY_CUES = re.compile(
+    r"\b("
+    r"(?<!what )i(?: just| also| still)?(?: have|'ve| got| bought| picked up"
+    r"| grabbed| ordered| ran out| used(?: up)?| finished| threw (?:out|away)"
+    r"| no longer have| don'?t have)"
+    r"|bought|picked up|stocked up|ran out of"
+    r"|we(?: have|'ve| got| bought| ran out| used| finished)"
+    r"|i(?: love| like| enjoy| prefer| hate| dislike| can'?t stand| don'?t like"
+    r"| can'?t eat| don'?t eat| avoid| want to (?:eat|cook|lose|gain|cut))"
+    r"|i'?m (?:allergic|vegan|vegetarian|pescatarian|intolerant|lactose|trying to"
+    r"|on a|cutting|bulking|out of)"
+    r"|allerg\w*|intoleran\w*|vegan|vegetarian|pescatarian|gluten[- ]free"
+    r"|dairy[- ]free|keto|paleo|halal|kosher|low[- ]carb|diabetic|celiac"
+    r"|my (?:fridge|pantry|freezer|cupboard|kitchen|groceries|diet|goal"
+    r"|ingredients|inventory|list)"
+    r"|in stock|leftovers?|grocery haul|out of stock|all out of|used up|got rid of"
+    r")\b",
+    re.IGNORECASE,
+)
+
+# Words that, next to a food, say it was gained, used up, removed or is
+# liked/disliked: "got some salmon", "no more eggs", "mushrooms make me sick"
+FOOD_ACTIONS = re.compile(
+    r"\b("
+    r"got|get|getting|bought|buy|buying|picked up|grabbed|ordered|delivered"
+    r"|came with|back from|store|groceries|restock\w*|stocked"
+    r"|out of|ran out|run out|running (?:out|low)|no more|left|finished|used"
+    r"|gone|ate|eaten|expired|spoiled|went bad|mouldy|moldy|rotten"
+    r"|remove|delete|drop|take(?: [\w ]{0,30})? off|toss(?:ed)?|threw"
+    r"|love[sd]?|hate[sd]?|dislike[sd]?|don'?t like|prefer\w*|enjoy\w*"
+    r"|favou?rite|can'?t stand|makes? me sick|sick|gross|disgusting|delicious"
+    r")\b",
+    re.IGNORECASE,
+)
+
+FOOD_VOCABULARY = frozenset(
+    """
+    apple avocado bacon banana basil bean beef bread broccoli butter cabbage
+    carrot cauliflower celery cheese chicken chickpea chili chive chocolate
+    cilantro cinnamon coconut cod corn cream cucumber cumin egg eggplant feta
+    flour garlic ginger ham honey kale lamb leek lemon lentil lettuce lime
+    mango milk mince mint mozzarella mushroom mustard noodle nut oat oil olive
+    onion orange oregano paprika parmesan parsley pasta pea peanut pepper pork
+    potato prawn pumpkin quinoa rice rosemary salmon salt sausage shallot
+    shrimp spaghetti spinach squash steak sugar thyme tofu tomato tortilla
+    tuna turkey vinegar yogurt yoghurt zucchini courgette scallion sriracha
+    soy sauce stock broth ketchup mayo mayonnaise jam cereal granola almond
+    walnut cashew pistachio raisin berry strawberry blueberry raspberry grape
+    pineapple peach pear plum cherry melon watermelon beet radish turnip
+    asparagus artichoke tempeh seitan halloumi ricotta cheddar brie gouda
+    """.split()
+)
+
+WORD = re.compile(r"[a-z]+")
+
+
+def normalize_word(word):
+    """Crude singular form, good enough for vocabulary lookups"""
+    if word.endswith("ies") and len(word) > 4:
+        return word[:-3] + "y"
+    if word.endswith("oes") and len(word) > 4:
+        return word[:-2]
+    if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+        return word[:-1]
+    return word
+
+
+class PreRouter:
+    """Decides before the chat model runs whether UpdateMemory could apply.
+
+    When it can't, the chat node leaves the tool schema out of the request.
+    Implementations should err on the side of True: a false negative means a
+    missed memory update, a false positive only costs the old behaviour.
+    """
+
+    def memory_may_apply(self, text: str) -> bool:
+        raise NotImplementedError
+
+    async def amemory_may_apply(self, text: str) -> bool:
+        return self.memory_may_apply(text)
+
+
+class LexiconPreRouter(PreRouter):
+    """Regex cues plus a food vocabulary, runs in microseconds.
+
+    A message qualifies if it contains a memory cue ("I bought", "I'm vegan",
+    "my fridge"), mentions a food together with a food action ("no more eggs",
+    "tomatoes are my favorite") or is mostly a list of foods ("eggs, milk and
+    2 onions").
+    """
+
+    def __init__(self, vocabulary=FOOD_VOCABULARY, min_food_ratio: float = 0.5):
+        self.vocabulary = vocabulary
+        self.min_food_ratio = min_food_ratio
+
+    def memory_may_apply(self, text: str) -> bool:
+        if MEMORY_CUES.search(text):
+            return True
+
+        words = WORD.findall(text.lower())
+        if not words:
+            return False
+        foods = sum(normalize_word(word) in self.vocabulary for word in words)
+        if not foods:
+            return False
+        if FOOD_ACTIONS.search(text):
+            return True
+        return foods / len(words) >= self.min_food_ratio
+
+
+PRE_ROUTER_PROMPT = """Does the following message tell us which food or ingredients the user has at home (gained or used up), or about their food preferences, allergies, dietary restrictions or cooking goals? Answer only "yes" or "no".
+
+Message: {text}"""
+
+
+class ModelPreRouter(PreRouter):
+    """Asks a small local chat model, e.g. a 0.6B-1.7B model served by Ollama"""
+
+    def __init__(self, model):
+        self.model = model
+
+    @staticmethod
+    def _is_yes(response):
+        answer = response.content.split("</think>")[-1].strip().lower()
+        return not answer.startswith("no")
+
+    def memory_may_apply(self, text: str) -> bool:
+        return self._is_yes(self.model.invoke(PRE_ROUTER_PROMPT.format(text=text)))
+
+    async def amemory_may_apply(self, text: str) -> bool:
+        response = await self.model.ainvoke(PRE_ROUTER_PROMPT.format(text=text))
+        return self._is_yes(response)
+
+
+class CascadePreRouter(PreRouter):
+    """Lexicon first, the model hook only for messages the lexicon rejects"""
+
+    def __init__(self, model_router: ModelPreRouter, lexicon=None):
+        self.lexicon = lexicon or LexiconPreRouter()
+        self.model_router = model_router
+
+    def memory_may_apply(self, text: str) -> bool:
+        return self.lexicon.memory_may_apply(
+            text
+        ) or self.model_router.memory_may_apply(text)
+
+    async def amemory_may_apply(self, text: str) -> bool:
+        return self.lexicon.memory_may_apply(
+            text
+        ) or await self.model_router.amemory_may_apply(text)
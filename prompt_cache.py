@@ -0,0 +1,99 @@
+import logging
+import threading
+from collections import OrderedDict, deque
+from os.path import commonprefix
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Rough characters per token, only used to express prefix reuse in tokens
+CHARS_PER_TOKEN = 4
+
+
+def render_prompt(messages):
+    """Flatten chat messages to compare prompt prefixes between calls"""
+    return "".join(f"<{message.type}>{message.content}" for message in messages)
+
+
+class PromptCacheMonitor(BaseCallbackHandler):
+    """Callback reporting prompt-eval versus cached prompt tokens per LLM call.
+
+    `cached_tokens` is what the server reports (OpenAI-style
+    `prompt_tokens_details.cached_tokens`), which Ollama doesn't always fill
+    in. `reusable_tokens` is our own estimate: the prefix shared with the
+    previous prompt of the same user and graph node, which a prefix cache can
+    skip.
+    """
+
+    def __init__(self, max_calls: int = 1000, max_prompts: int = 10_000):
+        self.calls = deque(maxlen=max_calls)
+        self._last_prompts: "OrderedDict[tuple, str]" = OrderedDict()
+        self._max_prompts = max_prompts
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        metadata = metadata or {}
+        key = (metadata.get("user_id"), metadata.get("langgraph_node"))
+        prompt = render_prompt(messages[0])
+
+        with self._lock:
+            previous = self._last_prompts.pop(key, "")
+            self._last_prompts[key] = prompt
+            if len(self._last_prompts) > self._max_prompts:
+                self._last_prompts.popitem(last=False)
+
+            self._pending[run_id] = {
+                "user_id": key[0],
+                "node": key[1],
+                "prompt_chars": len(prompt),
+                "reusable_chars": len(commonprefix([previous, prompt])),
+            }
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            call = self._pending.pop(run_id, None)
+        if call is None:
+            return
+
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None and message.usage_metadata:
+                    usage = message.usage_metadata
+
+        prompt_tokens = usage.get("input_tokens")
+        if prompt_tokens is None:
+            prompt_tokens = call["prompt_chars"] // CHARS_PER_TOKEN
+        call["prompt_tokens"] = prompt_tokens
+        call["cached_tokens"] = usage.get("input_token_details", {}).get("cache_read")
+        call["reusable_tokens"] = min(
+            prompt_tokens, call["reusable_chars"] // CHARS_PER_TOKEN
+        )
+
+        with self._lock:
+            self.calls.append(call)
+        logger.debug("prompt cache %s", call)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._pending.pop(run_id, None)
+
+    def stats(self):
+        """Totals over the recorded calls"""
+        with self._lock:
+            calls = list(self.calls)
+        prompt_tokens = sum(call["prompt_tokens"] for call in calls)
+        reusable_tokens = sum(call["reusable_tokens"] for call in calls)
+        cached_tokens = sum(call["cached_tokens"] or 0 for call in calls)
+        return {
+            "calls": len(calls),
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "reusable_tokens": reusable_tokens,
+            "reusable_ratio": reusable_tokens / prompt_tokens if prompt_tokens else 0.0,
+        }
@@ -1,3 +1,7 @@
+# Prompts are split into a static part that is sent first and a small
+# per-user part (memories, time) sent after the conversation, so the model
+# server can reuse its cached prefix when the memories change.
+
 MODEL_SYSTEM_MESSAGE = """You are a helpful chatbot.
 
 You are designed to be a companion to a user, helping them keep track of which ingredients they have at home and which meals they can cook using these ingredients and only these ingredients.
@@ -6,15 +10,7 @@ You have a long term memory which keeps track of two things:
 1. The user's preferences (what food they like, dietary restrictions, food related goals)
 2. The user's ingredients (that they have at home)
 
-Here is the current User Preferences (may be empty if no information has been collected yet):
-<user_preferences>
-{user_preferences}
-</user_preferences>
-
-Here is the current ingredients that the user have at home (may be empty if no ingredients have been added yet):
-<ingredients>
-{ingredients}
-</ingredients>
+Their current contents are given after the conversation, in the <user_preferences> and <ingredients> tags.
 
 Here are your instructions for reasoning about the user's messages:
 
@@ -34,12 +30,28 @@ Here are your instructions for reasoning about the user's messages:
 
 6. Respond naturally to user user after a tool call was made to save memories, or if no tool call was made."""
 
+# Appended to MODEL_SYSTEM_MESSAGE when the agent has a recipe index
+RECIPES_MESSAGE = """
+
+7. When the user asks what they can cook or wants meal ideas, call the FindRecipes tool first and base your suggestions on the recipes it returns. Set max_missing to 0 for meals they can cook right now, or higher if they don't mind buying a few things. Mention any missing ingredients."""
+
+MODEL_MEMORY_MESSAGE = """Here is the current User Preferences (may be empty if no information has been collected yet):
+<user_preferences>
+{user_preferences}
+</user_preferences>
+
+Here is the current ingredients that the user have at home (may be empty if no ingredients have been added yet):
+<ingredients>
+{ingredients}
+</ingredients>"""
+
 PREFERENCES_INSTRUCTION = """Reflect on the following interaction. 
 
 Extract and update information about the user based on this interaction to manage their preferences.
 Include information about what food they like, their allergies, their food-related goals.
+The current preferences are given after the interaction."""
 
-Current preferences:
+PREFERENCES_CONTEXT = """Current preferences:
 {current_preferences}
 
 System Time: {time}"""
@@ -48,8 +60,55 @@ INGREDIENTS_INSTRUCTION = """Reflect on the following interaction.
 
 Extract information about ingredients the user has at home from this conversation.
 IMPORTANT: You must return ALL ingredients the user has, both from the current interaction AND all previous ingredients.
+The current ingredients inventory is given after the interaction, these must be included in your response unless explicitly removed by the user."""
+
+INGREDIENTS_CONTEXT = """Current ingredients inventory:
+{current_ingredients}
+
+System Time: {time}"""
+
+PREFERENCES_PATCH_INSTRUCTION = """Reflect on the following interaction.
+
+Extract what changed about the user's preferences in this interaction: what food they like or dislike, their allergies and dietary restrictions, their food-related goals.
+Only return the changes: items to add, items to remove and items to rename for each category. Leave a category empty if nothing changed. Do not repeat preferences that are already stored.
+The current preferences are given after the interaction."""
+
+INGREDIENTS_PATCH_INSTRUCTION = """Reflect on the following interaction.
+
+Extract what changed about the ingredients the user has at home in this interaction.
+Only return the changes: ingredients the user got (add), ingredients they used up or no longer have (remove) and ingredients that should be renamed (rename). Do not repeat ingredients that are already in the inventory.
+The current ingredients inventory is given after the interaction."""
+
+SUMMARY_MESSAGE = """Here is a summary of the earlier conversation with the user:
+<conversation_summary>
+{summary}
+</conversation_summary>"""
+
+SUMMARIZE_INSTRUCTION = """Summarize the conversation above in a few sentences so it can replace the original messages.
+Keep anything that matters for future replies, such as meals that were suggested or questions that are still open. Ingredients and preferences are stored separately and don't need to be repeated.
+
+Existing summary to extend (may be empty):
+{summary}"""
+
+MEMORY_INSTRUCTION = """Reflect on the following interaction.
+
+Extract and update both kinds of information about the user from this interaction:
+1. Their preferences: what food they like, their allergies, their food-related goals.
+2. The ingredients they have at home. IMPORTANT: You must return ALL ingredients the user has, both from the current interaction AND all previous ingredients.
+The current preferences and ingredients inventory are given after the interaction, these must be included in your response unless explicitly removed by the user."""
+
+MEMORY_PATCH_INSTRUCTION = """Reflect on the following interaction.
+
+Extract what changed in this interaction about:
+1. The user's preferences: what food they like or dislike, their allergies and dietary restrictions, their food-related goals.
+2. The ingredients the user has at home: ingredients they got (add), ingredients they used up or no longer have (remove) and ingredients that should be renamed (rename).
+Only return the changes and leave a category empty if nothing changed. Do not repeat preferences or ingredients that are already stored.
+The current preferences and ingredients inventory are given after the interaction."""
+
+MEMORY_CONTEXT = """Current preferences:
+{current_preferences}
 
-Current ingredients inventory (these must be included in your response unless explicitly removed by the user):
+Current ingredients inventory:
 {current_ingredients}
 
 System Time: {time}"""
@@ -0,0 +1,66 @@
+import base64
+import zlib
+from typing import Literal, Optional
+
+from langchain_core.messages import AIMessage
+
+THINK_START = "<think>"
+THINK_END = "</think>"
+
+# Compressed reasoning is kept in the message's additional_kwargs, which are
+# not sent back to the model
+REASONING_KEY = "reasoning_zlib"
+
+ReasoningStorage = Literal["compressed", "drop"]
+DEFAULT_REASONING_STORAGE: ReasoningStorage = "compressed"
+
+
+def split_reasoning(content: str) -> tuple[Optional[str], str]:
+    """Split Qwen3 output into its <think> part and the answer.
+
+    Also handles partially streamed content where </think> hasn't arrived yet.
+    """
+    if THINK_START not in content:
+        return None, content
+    if THINK_END not in content:
+        return content.replace(THINK_START, "").strip(), ""
+    thinking_part, response_part = content.split(THINK_END, 1)
+    return thinking_part.replace(THINK_START, "").strip(), response_part.strip()
+
+
+def compress_reasoning(reasoning: str) -> str:
+    return base64.b64encode(zlib.compress(reasoning.encode())).decode()
+
+
+def decompress_reasoning(compressed: str) -> str:
+    return zlib.decompress(base64.b64decode(compressed)).decode()
+
+
+def strip_reasoning(message, storage: ReasoningStorage = DEFAULT_REASONING_STORAGE):
+    """Return the message without <think> content, keeping that compressed or not"""
+    if not isinstance(message, AIMessage) or not isinstance(message.content, str):
+        return message
+
+    reasoning, answer = split_reasoning(message.content)
+    if reasoning is None:
+        return message
+
+    additional_kwargs = dict(message.additional_kwargs)
+    if storage == "compressed" and reasoning:
+        additional_kwargs[REASONING_KEY] = compress_reasoning(reasoning)
+    return message.model_copy(
+        update={"content": answer, "additional_kwargs": additional_kwargs}
+    )
+
+
+def without_reasoning(messages):
+    """Model context with any <think> content removed from AI messages"""
+    return [strip_reasoning(message, storage="drop") for message in messages]
+
+
+def message_reasoning(message) -> tuple[Optional[str], str]:
+    """The (reasoning, answer) of a message, whether it was stripped or not"""
+    compressed = message.additional_kwargs.get(REASONING_KEY)
+    if compressed:
+        return decompress_reasoning(compressed), message.content
+    return split_reasoning(message.content)
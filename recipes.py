@@ -0,0 +1,357 @@
+import json
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+from canonicalize import IngredientCanonicalizer, shared_canonicalizer
+
+# Assumed to be in every kitchen, recipes never count them as missing
+STAPLES = frozenset({"salt", "pepper", "black pepper", "water", "oil", "olive oil"})
+
+WORDS = re.compile(r"[a-z]+")
+
+# Wording around the restriction itself, "I'm vegetarian", "vegan diet"
+RESTRICTION_WORDING = re.compile(
+    r"^(?:i|we)(?:'m|'re|m| am| are)?\s+(?:(?:a|an|on|strict(?:ly)?|follow)\s+)*"
+    r"|\s+(?:diet|only)$"
+)
+
+# Wording around the ingredient in restrictions like "allergic to peanuts"
+RESTRICTION_NOISE = re.compile(
+    r"^(?:no|avoid|without|not|allergic to|allergy to|"
+    r"(?:don't|do not|can't|cannot) (?:eat|have))\s+"
+    r"|\s+(?:allergy|allergies|intolerance|intolerant|free)$"
+)
+
+# What's left of common restrictions ("no meat", "lactose intolerant") to the
+# tags of the recipes that satisfy them, any one of them will do. Kosher
+# recipes mix no meat with dairy; whether the meat itself is kosher or halal
+# is left to the user.
+RESTRICTION_TAGS = {
+    "vegetarian": ("vegetarian",),
+    "vegan": ("vegan",),
+    "pescatarian": ("pescatarian",),
+    "meat": ("vegetarian", "pescatarian"),
+    "veggie": ("vegetarian",),
+    "plant-based": ("vegan",),
+    "animal-products": ("vegan",),
+    "dairy": ("dairy-free",),
+    "lactose": ("dairy-free",),
+    "gluten": ("gluten-free",),
+    "celiac": ("gluten-free",),
+    "coeliac": ("gluten-free",),
+    "pescetarian": ("pescatarian",),
+    "kosher": ("vegetarian", "pescatarian", "dairy-free"),
+}
+
+# Ingredient families, as words of the ingredients that belong to them
+INGREDIENT_FAMILIES = {
+    "nut": (
+        "nut", "peanut", "almond", "cashew", "walnut", "pecan", "hazelnut",
+        "pistachio", "macadamia", "praline", "marzipan", "nutella",
+    ),
+    "shellfish": (
+        "shellfish", "shrimp", "prawn", "crab", "lobster", "crayfish",
+        "langoustine", "scallop", "mussel", "clam", "oyster", "squid",
+        "calamari", "octopus",
+    ),
+    "fish": (
+        "fish", "salmon", "tuna", "cod", "haddock", "pollock", "tilapia",
+        "trout", "mackerel", "sardine", "anchovy", "halibut", "bass", "snapper",
+        "swordfish", "caesar dressing", "worcestershire",
+    ),
+    "pork": (
+        "pork", "bacon", "ham", "sausage", "pancetta", "prosciutto",
+        "guanciale", "chorizo", "salami", "pepperoni", "lard", "gelatin",
+    ),
+    "alcohol": (
+        "wine", "beer", "rum", "vodka", "brandy", "sherry", "sake", "mirin",
+        "bourbon", "whisky", "whiskey",
+    ),
+    "starch": (
+        "pasta", "spaghetti", "noodle", "rice", "bread", "crouton", "tortilla",
+        "potato", "flour", "sugar", "honey", "oat", "banana", "bean", "lentil",
+        "chickpea", "pea", "corn",
+    ),
+}
+
+# Restrictions and dislikes naming ingredient families ("nut allergy", "no
+# seafood", "keto") to the families recipes must not contain
+RESTRICTION_FAMILIES = {
+    "nut": ("nut",),
+    "tree-nut": ("nut",),
+    "shellfish": ("shellfish",),
+    "fish": ("fish",),
+    "seafood": ("fish", "shellfish"),
+    "pork": ("pork",),
+    "pig": ("pork",),
+    "alcohol": ("alcohol",),
+    "kosher": ("pork", "shellfish"),
+    "halal": ("pork", "alcohol"),
+    "low-carb": ("starch",),
+    "low-carbohydrate": ("starch",),
+    "keto": ("starch",),
+    "ketogenic": ("starch",),
+}
+
+
+def canonical_tag(tag: str) -> str:
+    """"Gluten free" -> "gluten-free" """
+    return "-".join(WORDS.findall(tag.lower()))
+
+
+@dataclass
+class Recipe:
+    name: str
+    ingredients: List[str]
+    tags: List[str] = field(default_factory=list)
+    minutes: Optional[int] = None
+
+
+@dataclass
+class RecipeMatch:
+    recipe: Recipe
+    missing: List[str]
+
+
+class RecipeIndex:
+    """Recipes as ingredient bitsets for vectorized pantry matching.
+
+    Every distinct canonical ingredient gets a bit, the most common ones the
+    lowest. Recipes are stored block-major: `bits[block, recipe]` holds
+    ingredients 64 * block to 64 * block + 63 of a recipe. The number of
+    pantry ingredients a recipe uses is then a popcount of `bits & pantry`
+    over only the blocks the pantry touches, for all recipes at once, and a
+    recipe is missing `count - used` ingredients.
+    """
+
+    def __init__(
+        self,
+        recipes: Iterable[Recipe],
+        staples=STAPLES,
+        canonicalizer: Optional[IngredientCanonicalizer] = None,
+    ):
+        self.recipes = list(recipes)
+        # The same canonical names as the stored pantries
+        self.canonicalizer = canonicalizer or shared_canonicalizer
+        self.canonicalize = self.canonicalizer.canonicalize
+
+        rows = [
+            {self.canonicalize(name) for name in recipe.ingredients} - {""}
+            for recipe in self.recipes
+        ]
+        frequency = Counter(name for row in rows for name in row)
+        self.names = [name for name, _ in frequency.most_common()]
+        self.vocabulary = {name: i for i, name in enumerate(self.names)}
+
+        recipe_rows = np.repeat(np.arange(len(rows)), [len(row) for row in rows])
+        ids = np.array(
+            [self.vocabulary[name] for row in rows for name in row], dtype=np.uint64
+        )
+        blocks = max(1, (len(self.names) + 63) // 64)
+        self.bits = np.zeros((blocks, len(rows)), dtype=np.uint64)
+        np.bitwise_or.at(
+            self.bits,
+            ((ids >> np.uint64(6)).astype(np.intp), recipe_rows),
+            np.uint64(1) << (ids & np.uint64(63)),
+        )
+        self.counts = np.array([len(row) for row in rows], dtype=np.int32)
+
+        # Vocabulary entries by word, so "mushrooms" also finds "button mushroom"
+        self._by_word = {}
+        for name, ingredient_id in self.vocabulary.items():
+            for word in name.split():
+                self._by_word.setdefault(word, set()).add(ingredient_id)
+
+        self.tags = {}
+        for row, recipe in enumerate(self.recipes):
+            for tag in recipe.tags:
+                mask = self.tags.setdefault(
+                    canonical_tag(tag), np.zeros(len(self.recipes), dtype=bool)
+                )
+                mask[row] = True
+
+        self.staples = self.encode(staples)
+
+    @classmethod
+    def from_jsonl(cls, path, **kwargs):
+        """One JSON recipe per line: name, ingredients, optional tags/minutes"""
+        with open(path) as f:
+            recipes = [Recipe(**json.loads(line)) for line in f if line.strip()]
+        return cls(recipes, **kwargs)
+
+    def _bitset(self, ids):
+        bitset = np.zeros(self.bits.shape[0], dtype=np.uint64)
+        for ingredient_id in ids:
+            bitset[ingredient_id >> 6] |= np.uint64(1) << np.uint64(ingredient_id & 63)
+        return bitset
+
+    def encode(self, names: Iterable[str]) -> np.ndarray:
+        """Bitset of the known ingredients among `names`, unknown ones are ignored"""
+        ids = {self.vocabulary.get(self.canonicalize(name)) for name in names}
+        ids.discard(None)
+        return self._bitset(ids)
+
+    def _overlap(self, bitset):
+        """How many of the ingredients in `bitset` each recipe contains"""
+        overlap = np.zeros(self.bits.shape[1], dtype=np.int32)
+        for block in np.flatnonzero(bitset):
+            overlap += np.bitwise_count(self.bits[block] & bitset[block])
+        return overlap
+
+    def _mentioning(self, term):
+        """Ids of the ingredients containing every word of `term`"""
+        words = self.canonicalize(term).split()
+        if not words:
+            return set()
+        ids = set(self._by_word.get(words[0], ()))
+        for word in words[1:]:
+            ids &= self._by_word.get(word, set())
+        return ids
+
+    def _families(self, term):
+        """The ingredient families `term` names, "nuts" -> ("nut",)"""
+        for key in (canonical_tag(term), canonical_tag(self.canonicalize(term))):
+            if key in RESTRICTION_FAMILIES:
+                return RESTRICTION_FAMILIES[key]
+        return None
+
+    def _excluded_by(self, term):
+        """Ids of the ingredients a dislike or restriction term rules out"""
+        families = self._families(term)
+        if families is None:
+            return self._mentioning(term)
+        return {
+            ingredient_id
+            for family in families
+            for word in INGREDIENT_FAMILIES[family]
+            for ingredient_id in self._mentioning(word)
+        }
+
+    def _restriction(self, restriction):
+        """Tags one of which a recipe needs and ingredient ids it must not
+        contain to satisfy `restriction`, None if it names no tag, ingredient
+        family or known ingredient"""
+        restriction = RESTRICTION_WORDING.sub(
+            "", restriction.lower().replace("\u2019", "'").strip()
+        )
+        term = RESTRICTION_NOISE.sub("", restriction)
+        tags = RESTRICTION_TAGS.get(canonical_tag(term), ())
+        if canonical_tag(restriction) in self.tags:
+            tags += (canonical_tag(restriction),)
+        excluded = self._excluded_by(term)
+
+        if (
+            tags
+            or excluded
+            or self._families(term) is not None
+            or self.canonicalize(term) in self.canonicalizer.vocabulary
+        ):
+            return tags, excluded
+        return None
+
+    def unrecognized_restrictions(self, restrictions: Iterable[str]) -> List[str]:
+        """The dietary restrictions `search` can't interpret and ignores"""
+        return [
+            restriction
+            for restriction in restrictions
+            if self._restriction(restriction) is None
+        ]
+
+    def _missing(self, row, have):
+        missing = self.bits[:, row] & ~have
+        return [
+            self.names[ingredient_id]
+            for ingredient_id in np.flatnonzero(
+                np.unpackbits(missing.view(np.uint8), bitorder="little")
+            )
+        ]
+
+    def search(
+        self,
+        ingredients: Iterable[str],
+        max_missing: int = 0,
+        dislikes: Iterable[str] = (),
+        dietary_restrictions: Iterable[str] = (),
+        must_use: Iterable[str] = (),
+        limit: int = 10,
+    ) -> List[RecipeMatch]:
+        """Recipes missing at most `max_missing` of the given ingredients.
+
+        Recipes with a disliked ingredient are left out. A dietary
+        restriction that names a recipe tag ("vegan", "I'm gluten free") or
+        a common phrase for one ("no meat", "lactose intolerant") keeps only
+        recipes with that tag. One naming an ingredient family ("nut
+        allergy", "no pork", "keto") excludes the family's ingredients, any
+        other ("allergic to peanuts") the ingredients it mentions.
+        Restrictions that are none of these are ignored, see
+        `unrecognized_restrictions`. Each `must_use` term needs a recipe
+        ingredient mentioning it ("chicken" finds "chicken breast"), one
+        that no recipe has means no results. Results are ordered by missing
+        ingredients, then by most ingredients used.
+        """
+        have = self.encode(ingredients) | self.staples
+        used = self._overlap(have)
+        missing = self.counts - used
+        candidates = missing <= max_missing
+
+        excluded = set()
+        for dislike in dislikes:
+            excluded |= self._excluded_by(dislike)
+        for restriction in dietary_restrictions:
+            rule = self._restriction(restriction)
+            if rule is None:
+                continue
+            tags, ingredient_ids = rule
+            if tags:
+                # A tag no recipe has leaves no recipe
+                none = np.zeros(len(self.recipes), dtype=bool)
+                candidates &= np.logical_or.reduce(
+                    [self.tags.get(tag, none) for tag in tags]
+                )
+            excluded |= ingredient_ids
+        if excluded:
+            candidates &= self._overlap(self._bitset(excluded)) == 0
+
+        for name in must_use:
+            if not self.canonicalize(name):
+                continue
+            ids = self._mentioning(name)
+            if not ids:
+                return []
+            candidates &= self._overlap(self._bitset(ids)) > 0
+
+        rows = np.flatnonzero(candidates)
+        rows = rows[np.lexsort((-used[rows], missing[rows]))[:limit]]
+
+        return [
+            RecipeMatch(self.recipes[row], self._missing(row, have)) for row in rows
+        ]
+
+
+def format_matches(
+    matches: List[RecipeMatch], unrecognized_restrictions: Iterable[str] = ()
+) -> str:
+    """Tool message listing recipe matches for the chat model"""
+    note = ""
+    if unrecognized_restrictions:
+        note = (
+            "\nThese dietary restrictions were not checked, make sure the "
+            f"recipes meet them: {', '.join(unrecognized_restrictions)}"
+        )
+    if not matches:
+        return "No matching recipes found in the recipe collection." + note
+
+    lines = []
+    for match in matches:
+        recipe = match.recipe
+        line = f"- {recipe.name}: {', '.join(recipe.ingredients)}"
+        if recipe.minutes:
+            line += f" ({recipe.minutes} min)"
+        if match.missing:
+            line += f". Missing: {', '.join(match.missing)}"
+        lines.append(line)
+    return "\n".join(lines) + note
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import os
+import threading
+
+import tracing
+from agent import IngredientTrackerAgent
+from checkpoint_retention import parse_retention
+from extraction_cache import ExtractionCache
+from llm_scheduler import LLMScheduler
+from memory import AsyncMemoryManager, MemoryManager
+from prerouter import LexiconPreRouter
+from recipes import RecipeIndex
+
+# Process-wide resources shared by every Streamlit session. They are created
+# lazily on first use so importing this module stays cheap.
+_lock = threading.Lock()
+_memory_manager = None
+_agent = None
+_metrics_server = None
+
+
+def get_memory_manager() -> MemoryManager:
+    """The shared MemoryManager with its connection pool and checkpointer"""
+    global _memory_manager
+    if _memory_manager is None:
+        with _lock:
+            if _memory_manager is None:
+                _memory_manager = MemoryManager(
+                    checkpoint_retention=parse_retention(
+                        os.getenv("CHECKPOINT_RETENTION")
+                    )
+                )
+    return _memory_manager
+
+
+def _scheduler():
+    """LLMScheduler over the comma-separated LLM_BACKENDS, if set"""
+    backends = [url.strip() for url in os.getenv("LLM_BACKENDS", "").split(",")]
+    backends = [url for url in backends if url]
+    if not backends:
+        return None
+    return LLMScheduler(
+        backends, max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+    )
+
+
+def _extraction_cache(memory_manager):
+    """ExtractionCache backed by the shared pool, if EXTRACTION_CACHE=1"""
+    if os.getenv("EXTRACTION_CACHE", "") != "1":
+        return None
+    return ExtractionCache(
+        pool=memory_manager.pool,
+        ttl=float(os.getenv("EXTRACTION_CACHE_TTL", str(24 * 3600))),
+    )
+
+
+def _recipe_index():
+    """RecipeIndex over the RECIPES JSONL corpus, if set"""
+    path = os.getenv("RECIPES", "")
+    return RecipeIndex.from_jsonl(path) if path else None
+
+
+def configure_trace_log():
+    """Turn traces as JSON lines to TRACE_LOG, if set"""
+    trace_log = os.getenv("TRACE_LOG", "")
+    if trace_log and not tracing.logger.handlers:
+        handler = logging.FileHandler(trace_log)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        tracing.logger.addHandler(handler)
+        tracing.logger.setLevel(logging.INFO)
+
+
+def _start_observability():
+    """Trace log and metrics on METRICS_PORT, if set"""
+    global _metrics_server
+    configure_trace_log()
+    port = os.getenv("METRICS_PORT", "")
+    if port:
+        _metrics_server = tracing.serve_metrics(int(port))
+
+
+def agent_options(memory_manager):
+    """IngredientTrackerAgent keyword arguments configured by the environment.
+    Background memory updates need a synchronous MemoryManager, they are left
+    off for an AsyncMemoryManager."""
+    return {
+        "background_memory_updates": (
+            os.getenv("BACKGROUND_MEMORY_UPDATES", "") == "1"
+            and not isinstance(memory_manager, AsyncMemoryManager)
+        ),
+        "pre_router": (
+            LexiconPreRouter() if os.getenv("PRE_ROUTER", "") == "lexicon" else None
+        ),
+        "scheduler": _scheduler(),
+        "extraction_cache": _extraction_cache(memory_manager),
+        "recipe_index": _recipe_index(),
+    }
+
+
+def get_agent() -> IngredientTrackerAgent:
+    """The shared agent with its compiled graph and model client"""
+    global _agent
+    if _agent is None:
+        memory_manager = get_memory_manager()
+        with _lock:
+            if _agent is None:
+                _start_observability()
+                _agent = IngredientTrackerAgent(
+                    memory_manager, **agent_options(memory_manager)
+                )
+                # Queued memory updates are in process memory only, drain
+                # them before the interpreter exits
+                atexit.register(close)
+    return _agent
+
+
+def close():
+    """Drain background work and close the pool"""
+    global _memory_manager, _agent, _metrics_server
+    with _lock:
+        if _metrics_server is not None:
+            _metrics_server.shutdown()
+            _metrics_server.server_close()
+        if _agent is not None and _agent.memory_queue is not None:
+            _agent.memory_queue.shutdown()
+        if _memory_manager is not None:
+            _memory_manager.close()
+        _memory_manager = None
+        _agent = None
+        _metrics_server = None
@@ -0,0 +1,399 @@
+import asyncio
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Optional
+
+from dotenv import load_dotenv
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import ValidationError
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import resources
+from agent import IngredientTrackerAgent
+from checkpoint_retention import parse_retention
+from llm_scheduler import LLMScheduler
+from memory import AsyncMemoryManager
+from models import IngredientsPatch, PreferencesPatch
+from pantry_import import known_items, parse_items
+from reasoning import message_reasoning, strip_reasoning
+from tracing import PROMETHEUS_CONTENT_TYPE, TurnTrace, shared_metrics
+
+logger = logging.getLogger(__name__)
+
+HISTORY_PAGE_SIZE = 50
+
+# Why TurnGate turned a turn away: status code, Retry-After seconds, message
+REJECTIONS = {
+    "shutting_down": (503, 5, "server is shutting down"),
+    "turn_limit": (503, 1, "too many turns in progress"),
+    "user_limit": (429, 1, "this user already has turns in progress"),
+    "llm_queue": (503, 1, "LLM queue is full"),
+}
+
+
+class Rejected(Exception):
+    """A chat turn turned away by TurnGate, becomes an error response"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+        self.status_code, self.retry_after, self.message = REJECTIONS[reason]
+        super().__init__(self.message)
+
+
+class TurnGate:
+    """Admission control and per-user ordering of chat turns.
+
+    Turns of one user run one at a time, so two requests never race on the
+    same checkpointer thread, and at most `max_per_user` of them may be
+    running or waiting. A turn is rejected right away instead of queued when
+    `max_active` turns are in progress or more than `max_llm_queue` LLM
+    requests wait in the scheduler. Admitted turns run as tasks, a client
+    that disconnects doesn't cut a turn short halfway through its writes.
+    Ordering only holds within one process.
+    """
+
+    def __init__(
+        self,
+        max_active: int = 32,
+        max_per_user: int = 2,
+        scheduler: Optional[LLMScheduler] = None,
+        max_llm_queue: int = 32,
+    ):
+        self.max_active = max_active
+        self.max_per_user = max_per_user
+        self.scheduler = scheduler
+        self.max_llm_queue = max_llm_queue
+        self.closed = False
+        self.tasks = set()
+        # user_id -> [lock, admitted turns]
+        self._users = {}
+
+    def _check(self, user_id):
+        if self.closed:
+            raise Rejected("shutting_down")
+        if len(self.tasks) >= self.max_active:
+            raise Rejected("turn_limit")
+        if user_id in self._users and self._users[user_id][1] >= self.max_per_user:
+            raise Rejected("user_limit")
+        if self.scheduler is not None:
+            depth = sum(self.scheduler.stats()["queue_depth"].values())
+            if depth >= self.max_llm_queue:
+                raise Rejected("llm_queue")
+
+    def start(self, user_id, turn) -> asyncio.Task:
+        """Run the coroutine function `turn` under the user's lock.
+
+        Raises Rejected if the turn is not admitted.
+        """
+        try:
+            self._check(user_id)
+        except Rejected as e:
+            shared_metrics.inc("api_rejected_turns_total", reason=e.reason)
+            raise
+
+        entry = self._users.setdefault(user_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        task = asyncio.create_task(self._run(user_id, entry, turn))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def _run(self, user_id, entry, turn):
+        try:
+            async with entry[0]:
+                return await turn()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._users[user_id]
+
+    async def drain(self, timeout: float) -> bool:
+        """Stop admitting turns and wait for the running ones, cancelling
+        those still running after `timeout` seconds. Returns whether all
+        finished."""
+        self.closed = True
+        if not self.tasks:
+            return True
+        _, pending = await asyncio.wait(set(self.tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return not pending
+
+    def stats(self):
+        return {
+            "active_turns": len(self.tasks),
+            "active_users": len(self._users),
+            "closed": self.closed,
+        }
+
+
+def trace_summary(trace: TurnTrace):
+    """The trace without its individual spans"""
+    summary = trace.to_dict()
+    del summary["spans"]
+    return summary
+
+
+async def run_turn(
+    agent: IngredientTrackerAgent,
+    memory_manager: AsyncMemoryManager,
+    user_id,
+    text,
+    events: asyncio.Queue,
+):
+    """Stream one chat turn into `events` and append it to the chat log.
+
+    Puts ("token", chunk) tuples, then one ("done", reply) or ("error", ...).
+    """
+    config = {"configurable": {"user_id": user_id, "thread_id": user_id}}
+    user_message = HumanMessage(content=text)
+    trace = TurnTrace()
+    content = ""
+    message_id = None
+    try:
+        async for chunk in agent.astream([user_message], config, trace=trace):
+            # The chat node runs again after a tool call, the last reply counts
+            if chunk.id != message_id:
+                message_id = chunk.id
+                content = ""
+            content += chunk.content
+            events.put_nowait(("token", {"id": chunk.id, "content": chunk.content}))
+
+        reply = strip_reasoning(AIMessage(content=content), agent.reasoning_storage)
+        await memory_manager.append_streamlit_messages(user_id, [user_message, reply])
+        reasoning, answer = message_reasoning(reply)
+        events.put_nowait(
+            (
+                "done",
+                {
+                    "reply": answer,
+                    "reasoning": reasoning,
+                    "trace": trace_summary(trace),
+                },
+            )
+        )
+    except asyncio.CancelledError:
+        events.put_nowait(("error", {"error": "server is shutting down"}))
+        raise
+    except Exception:
+        logger.exception("Chat turn of %s failed", user_id)
+        events.put_nowait(("error", {"error": "chat turn failed"}))
+
+
+async def server_sent_events(events: asyncio.Queue):
+    while True:
+        kind, data = await events.get()
+        yield f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+        if kind != "token":
+            return
+
+
+def error(status_code: int, message: str, **headers):
+    return JSONResponse({"error": message}, status_code=status_code, headers=headers)
+
+
+async def request_json(request: Request):
+    try:
+        body = await request.json()
+    except json.JSONDecodeError:
+        return None
+    return body if isinstance(body, dict) else None
+
+
+async def chat(request: Request):
+    """POST {"message": ..., "stream": false}. Replies with the answer as JSON,
+    or with "stream": true as server-sent token events ending in "done"."""
+    state = request.app.state
+    user_id = request.path_params["user_id"]
+    body = await request_json(request)
+    if body is None or not isinstance(body.get("message"), str):
+        return error(400, 'expected a JSON object with a "message" string')
+    if not body["message"].strip():
+        return error(400, "message is empty")
+
+    events = asyncio.Queue()
+    try:
+        state.gate.start(
+            user_id,
+            partial(
+                run_turn,
+                state.agent,
+                state.memory_manager,
+                user_id,
+                body["message"],
+                events,
+            ),
+        )
+    except Rejected as e:
+        return error(e.status_code, e.message, **{"Retry-After": str(e.retry_after)})
+
+    if body.get("stream"):
+        return StreamingResponse(
+            server_sent_events(events),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    while True:
+        kind, data = await events.get()
+        if kind == "done":
+            return JSONResponse(data)
+        if kind == "error":
+            return JSONResponse(data, status_code=500)
+
+
+def model_dict(model):
+    return model.model_dump() if model is not None else None
+
+
+async def get_memory(request: Request):
+    memory_manager = request.app.state.memory_manager
+    user_id = request.path_params["user_id"]
+    preferences = await memory_manager.get_preferences_model(user_id)
+    ingredients = await memory_manager.get_ingredients_model(user_id)
+    return JSONResponse(
+        {"preferences": model_dict(preferences), "ingredients": model_dict(ingredients)}
+    )
+
+
+async def patch_preferences(request: Request):
+    """PATCH with a models.PreferencesPatch, returns the updated preferences"""
+    body = await request_json(request)
+    try:
+        patch = PreferencesPatch.model_validate(body)
+    except ValidationError as e:
+        return error(422, str(e))
+    preferences = await request.app.state.memory_manager.patch_preferences(
+        request.path_params["user_id"], patch
+    )
+    return JSONResponse({"preferences": json.loads(preferences)})
+
+
+async def patch_ingredients(request: Request):
+    """PATCH with a models.IngredientsPatch, returns the updated ingredients"""
+    body = await request_json(request)
+    try:
+        patch = IngredientsPatch.model_validate(body)
+    except ValidationError as e:
+        return error(422, str(e))
+    ingredients = await request.app.state.memory_manager.patch_ingredients(
+        request.path_params["user_id"], patch
+    )
+    return JSONResponse({"ingredients": json.loads(ingredients)})
+
+
+async def import_pantry(request: Request):
+    """POST a grocery list as the body, ?format=text (csv, json, receipt) and
+    &known_only=1 to skip items outside the vocabulary (always for receipts).
+    Adds the items without a model call, returns the counts."""
+    memory_manager = request.app.state.memory_manager
+    user_id = request.path_params["user_id"]
+    import_format = request.query_params.get("format", "text")
+    try:
+        items = parse_items((await request.body()).decode(), import_format, user_id)
+    except (ValueError, KeyError, TypeError) as e:
+        return error(400, f"could not parse the {import_format} import: {e}")
+
+    items = [item.model_copy(update={"user_id": user_id}) for item in items]
+    if import_format == "receipt" or request.query_params.get("known_only") == "1":
+        items = known_items(items, memory_manager.canonicalizer)
+    return JSONResponse(await memory_manager.import_pantry_items(items))
+
+
+async def history(request: Request):
+    """Chat log page, oldest first: ?limit=50&before=<seq of the oldest shown>.
+    Pages hold at most HISTORY_PAGE_SIZE messages."""
+    try:
+        limit = int(request.query_params.get("limit", HISTORY_PAGE_SIZE))
+        before = request.query_params.get("before")
+        before = int(before) if before is not None else None
+    except ValueError:
+        return error(400, "limit and before must be integers")
+    if limit < 1:
+        return error(400, "limit must be at least 1")
+    limit = min(limit, HISTORY_PAGE_SIZE)
+
+    messages = await request.app.state.memory_manager.load_streamlit_messages(
+        request.path_params["user_id"], limit=limit, before_seq=before
+    )
+    page = []
+    for message in messages:
+        reasoning, content = message_reasoning(message)
+        page.append(
+            {
+                "seq": message.additional_kwargs["seq"],
+                "role": message.type,
+                "content": content,
+                "reasoning": reasoning,
+            }
+        )
+    return JSONResponse({"messages": page})
+
+
+async def metrics(request: Request):
+    return Response(shared_metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+async def health(request: Request):
+    state = request.app.state
+    stats = {"turns": state.gate.stats(), "pool": state.memory_manager.pool.get_stats()}
+    if state.agent.scheduler is not None:
+        stats["llm"] = state.agent.scheduler.stats()
+    return JSONResponse(stats, status_code=503 if state.gate.closed else 200)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    """One AsyncMemoryManager and agent for all requests. On shutdown running
+    turns get SHUTDOWN_TIMEOUT seconds to finish before the pool closes."""
+    load_dotenv()
+    resources.configure_trace_log()
+    memory_manager = AsyncMemoryManager(
+        checkpoint_retention=parse_retention(os.getenv("CHECKPOINT_RETENTION"))
+    )
+    await memory_manager.setup()
+    try:
+        agent = IngredientTrackerAgent(
+            memory_manager, **resources.agent_options(memory_manager)
+        )
+    except Exception:
+        await memory_manager.close()
+        raise
+
+    app.state.memory_manager = memory_manager
+    app.state.agent = agent
+    app.state.gate = TurnGate(
+        max_active=int(os.getenv("MAX_ACTIVE_TURNS", "32")),
+        max_per_user=int(os.getenv("MAX_TURNS_PER_USER", "2")),
+        scheduler=agent.scheduler,
+        max_llm_queue=int(os.getenv("MAX_LLM_QUEUE", "32")),
+    )
+    try:
+        yield
+    finally:
+        timeout = float(os.getenv("SHUTDOWN_TIMEOUT", "30"))
+        if not await app.state.gate.drain(timeout):
+            logger.warning("Cancelled chat turns still running after %ss", timeout)
+        await memory_manager.close()
+
+
+app = Starlette(
+    routes=[
+        Route("/users/{user_id}/chat", chat, methods=["POST"]),
+        Route("/users/{user_id}/memory", get_memory, methods=["GET"]),
+        Route("/users/{user_id}/preferences", patch_preferences, methods=["PATCH"]),
+        Route("/users/{user_id}/ingredients", patch_ingredients, methods=["PATCH"]),
+        Route("/users/{user_id}/pantry", import_pantry, methods=["POST"]),
+        Route("/users/{user_id}/history", history, methods=["GET"]),
+        Route("/metrics", metrics, methods=["GET"]),
+        Route("/health", health, methods=["GET"]),
+    ],
+    lifespan=lifespan,
+)
@@ -0,0 +1,445 @@
+import json
+import logging
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+import psycopg
+import psycopg_pool
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds, from an indexed query up to a long generation
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_HELP = {
+    "turn_seconds": "Wall time of a chat turn",
+    "node_seconds": "Time spent in a LangGraph node",
+    "llm_seconds": "Duration of an LLM call",
+    "llm_tokens_total": "Prompt and completion tokens of LLM calls",
+    "db_query_seconds": "Duration of a database statement",
+    "db_pool_wait_seconds": "Time spent waiting for a pooled connection",
+    "api_rejected_turns_total": "Chat turns the API server turned away",
+}
+
+# Verb and table of a statement, a low-cardinality metric label. Writes
+# come first, so a CTE that selects and then inserts counts as an insert.
+STATEMENTS = [
+    re.compile(pattern, re.IGNORECASE | re.DOTALL)
+    for pattern in [
+        r"\b(insert)\s+into\s+(\w+)",
+        r"\b(delete)\s+from\s+(\w+)",
+        r"\b(update)\s+(\w+)\s+set\b",
+        r"\b(create)\s+(?:table|index|extension)\s+(?:concurrently\s+)?"
+        r"(?:if\s+not\s+exists\s+)?(\w+)",
+        r"\b(select)\b.*?\bfrom\s+(\w+)(?![\w(])",
+        r"\b(select|copy|listen|notify|set|begin|commit|rollback)\b()",
+    ]
+]
+
+
+class Metrics:
+    """Process-wide counters and histograms, rendered in Prometheus text format"""
+
+    def __init__(self, prefix: str = "ingrai", buckets=BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self._counters = {}
+        # (name, labels) -> [count per bucket..., sum, count]
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[i] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                (key, list(values)) for key, values in self._histograms.items()
+            )
+
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {metric} {kind}")
+
+        for (name, labels), value in counters:
+            describe(name, "counter")
+            lines.append(f"{self.prefix}_{name}{format_labels(labels)} {value}")
+
+        for (name, labels), values in histograms:
+            describe(name, "histogram")
+            metric = f"{self.prefix}_{name}"
+            for bound, count in zip(self.buckets, values):
+                bucket_labels = format_labels(labels + (("le", str(bound)),))
+                lines.append(f"{metric}_bucket{bucket_labels} {count}")
+            bucket_labels = format_labels(labels + (("le", "+Inf"),))
+            lines.append(f"{metric}_bucket{bucket_labels} {values[-1]}")
+            lines.append(f"{metric}_sum{format_labels(labels)} {values[-2]}")
+            lines.append(f"{metric}_count{format_labels(labels)} {values[-1]}")
+
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+# Shared by every agent and memory manager in the process
+shared_metrics = Metrics()
+
+
+@dataclass
+class Span:
+    kind: str
+    name: str
+    # Seconds since the start of the turn
+    start: float
+    duration: float
+    attributes: dict = field(default_factory=dict)
+
+
+class TurnTrace:
+    """Spans of one chat turn: graph nodes, LLM calls, DB queries, pool waits.
+
+    Totals per (kind, name) are always kept, individual spans only up to
+    `max_spans`, so a turn with many queries stays bounded.
+    """
+
+    def __init__(self, user_id=None, thread_id=None, max_spans: int = 500):
+        self.turn_id = uuid.uuid4().hex
+        self.user_id = user_id
+        self.thread_id = thread_id
+        self.max_spans = max_spans
+
+        self.timestamp = time.time()
+        self.started_at = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.spans = []
+        self.dropped_spans = 0
+        self.totals = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def add(self, kind, name, started_at, duration, **attributes):
+        """Record a span that started at perf_counter() time `started_at`"""
+        span = Span(kind, name, started_at - self.started_at, duration, attributes)
+        with self._lock:
+            count, seconds = self.totals.get((kind, name), (0, 0.0))
+            self.totals[(kind, name)] = (count + 1, seconds + duration)
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped_spans += 1
+
+    def add_tokens(self, prompt_tokens, completion_tokens):
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started_at
+
+    def breakdown(self):
+        """Count and total seconds per (kind, name), slowest first"""
+        with self._lock:
+            totals = list(self.totals.items())
+        return [
+            {"kind": kind, "name": name, "count": count, "seconds": seconds}
+            for (kind, name), (count, seconds) in sorted(
+                totals, key=lambda item: -item[1][1]
+            )
+        ]
+
+    def to_dict(self):
+        with self._lock:
+            spans = [asdict(span) for span in self.spans]
+        return {
+            "turn_id": self.turn_id,
+            "user_id": self.user_id,
+            "thread_id": self.thread_id,
+            "timestamp": self.timestamp,
+            "duration": self.duration,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "breakdown": self.breakdown(),
+            "spans": spans,
+            "dropped_spans": self.dropped_spans,
+        }
+
+
+# The turn being traced. LangGraph copies the context into its worker
+# threads, so queries made by nodes are attributed to their turn.
+current_trace: ContextVar[Optional[TurnTrace]] = ContextVar(
+    "current_trace", default=None
+)
+
+
+def record(kind, name, started_at, metric, **labels):
+    """Add a span to the current turn and an observation to the metrics"""
+    duration = time.perf_counter() - started_at
+    shared_metrics.observe(metric, duration, **labels)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(kind, name, started_at, duration)
+
+
+@lru_cache(maxsize=1024)
+def _statement_name(query: str) -> str:
+    for statement in STATEMENTS:
+        match = statement.search(query)
+        if match is not None:
+            verb, table = match.groups()
+            return f"{verb.lower()} {table}".strip()
+    return "other"
+
+
+def statement_name(query) -> str:
+    """"select user_ingredients" for a query, used to group DB spans"""
+    if isinstance(query, bytes):
+        query = query.decode(errors="replace")
+    if not isinstance(query, str):
+        return "composed"
+    return _statement_name(query)
+
+
+def _record_query(query, started_at):
+    name = statement_name(query)
+    record("db", name, started_at, "db_query_seconds", statement=name)
+
+
+class TracedCursor(psycopg.Cursor):
+    """Cursor timing every statement it executes"""
+
+    def execute(self, query, params=None, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            _record_query(query, started_at)
+
+    def executemany(self, query, params_seq, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            _record_query(query, started_at)
+
+
+class AsyncTracedCursor(psycopg.AsyncCursor):
+    async def execute(self, query, params=None, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            _record_query(query, started_at)
+
+    async def executemany(self, query, params_seq, **kwargs):
+        started_at = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            _record_query(query, started_at)
+
+
+class TracedConnectionPool(psycopg_pool.ConnectionPool):
+    """Connection pool timing how long callers wait for a connection"""
+
+    def getconn(self, timeout=None):
+        started_at = time.perf_counter()
+        conn = super().getconn(timeout=timeout)
+        record("pool_wait", "pool", started_at, "db_pool_wait_seconds")
+        return conn
+
+
+class AsyncTracedConnectionPool(psycopg_pool.AsyncConnectionPool):
+    async def getconn(self, timeout=None):
+        started_at = time.perf_counter()
+        conn = await super().getconn(timeout=timeout)
+        record("pool_wait", "pool", started_at, "db_pool_wait_seconds")
+        return conn
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """Callback recording graph node and LLM call spans into a TurnTrace"""
+
+    # Keeps node start and end on the calling thread for async runs
+    run_inline = True
+
+    def __init__(self, trace: TurnTrace):
+        self.trace = trace
+        self._started = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, name):
+        with self._lock:
+            self._started[run_id] = (name, time.perf_counter())
+
+    def _pop(self, run_id):
+        with self._lock:
+            return self._started.pop(run_id, (None, None))
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs):
+        # Only the node's own run, not the runnables nested inside it
+        node = (metadata or {}).get("langgraph_node")
+        if node and not node.startswith("__") and kwargs.get("name") == node:
+            self._start(run_id, node)
+
+    def _end_node(self, run_id, error=False):
+        node, started_at = self._pop(run_id)
+        if node is None:
+            return
+        duration = time.perf_counter() - started_at
+        shared_metrics.observe("node_seconds", duration, node=node)
+        self.trace.add("node", node, started_at, duration, error=error)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_node(run_id, error=True)
+
+    def on_chat_model_start(
+        self, serialized, messages, *, run_id, metadata=None, **kwargs
+    ):
+        self._start(run_id, (metadata or {}).get("langgraph_node") or "none")
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        node, started_at = self._pop(run_id)
+        if node is None:
+            return
+        duration = time.perf_counter() - started_at
+
+        usage = {}
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None and message.usage_metadata:
+                    usage = message.usage_metadata
+        prompt_tokens = usage.get("input_tokens", 0)
+        completion_tokens = usage.get("output_tokens", 0)
+
+        shared_metrics.observe("llm_seconds", duration, node=node)
+        shared_metrics.inc("llm_tokens_total", prompt_tokens, node=node, type="prompt")
+        shared_metrics.inc(
+            "llm_tokens_total", completion_tokens, node=node, type="completion"
+        )
+        self.trace.add_tokens(prompt_tokens, completion_tokens)
+        self.trace.add(
+            "llm",
+            node,
+            started_at,
+            duration,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+        )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        node, started_at = self._pop(run_id)
+        if node is not None:
+            self.trace.add(
+                "llm", node, started_at, time.perf_counter() - started_at, error=True
+            )
+
+
+def _with_callback(config, handler):
+    callbacks = config.get("callbacks")
+    if callbacks is None:
+        callbacks = [handler]
+    elif isinstance(callbacks, list):
+        callbacks = callbacks + [handler]
+    else:
+        callbacks = callbacks.copy()
+        callbacks.add_handler(handler, inherit=True)
+    return {**config, "callbacks": callbacks}
+
+
+@contextmanager
+def trace_turn(config, trace: Optional[TurnTrace] = None):
+    """Trace a graph run, yields the config to run it with.
+
+    The finished trace is logged as one JSON object at INFO level.
+    """
+    configurable = config.get("configurable", {})
+    if trace is None:
+        trace = TurnTrace(configurable.get("user_id"), configurable.get("thread_id"))
+    else:
+        trace.user_id = trace.user_id or configurable.get("user_id")
+        trace.thread_id = trace.thread_id or configurable.get("thread_id")
+
+    previous = current_trace.get()
+    current_trace.set(trace)
+    try:
+        yield _with_callback(config, TraceCallbackHandler(trace))
+    finally:
+        # Not a token reset: an abandoned stream may be closed from another
+        # context
+        current_trace.set(previous)
+        trace.finish()
+        shared_metrics.observe("turn_seconds", trace.duration)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(trace.to_dict(), default=str))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = shared_metrics
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+def serve_metrics(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve `shared_metrics` on http://host:port/metrics from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(
+        target=server.serve_forever, name="metrics-endpoint", daemon=True
+    ).start()
+    return server